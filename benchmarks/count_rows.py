@@ -0,0 +1,65 @@
+"""
+Benchmark of mt2gf.utils.count_csv_rows against counting the rows of a form csv with pd.read_csv.
+
+Usage (from the repository root, mt2gf being installed): python benchmarks/count_rows.py [n_rows ...]
+"""
+import sys
+import tempfile
+from pathlib import Path
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+from mt2gf.utils import count_csv_rows
+
+
+def make_form_csv(path, n_rows, seed=0):
+    """
+    Write a csv shaped like the results of a Google form: a timestamp, a WorkerID, answers
+    to multiple choice questions and a free text answer containing quotes and newlines.
+    """
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(
+        {
+            "Timestamp": ["2020/11/30 10:00:00 AM GMT+1"] * n_rows,
+            "WorkerID": [f"A{i:013d}" for i in range(n_rows)],
+            **{f"Q{q}": rng.integers(1, 6, n_rows) for q in range(10)},
+            "Comments": rng.choice(
+                ["", "Nice task", 'Some "quoted" text,\nover two lines', "a\nb\nc"],
+                n_rows,
+            ),
+        }
+    )
+    df.to_csv(path, index=False)
+
+
+def timeit(func, repeat=5):
+    """
+    Return the result of func and its best running time in seconds over repeat runs
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = perf_counter()
+        result = func()
+        best = min(best, perf_counter() - start)
+    return result, best
+
+
+def main(sizes):
+    print(f"{'rows':>10} {'read_csv (ms)':>15} {'count_csv_rows (ms)':>20} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for n_rows in sizes:
+            path = Path(tmp_dir).joinpath(f"{n_rows}.csv")
+            make_form_csv(path, n_rows)
+            expected, pandas_time = timeit(lambda: pd.read_csv(path).shape[0])
+            n_counted, count_time = timeit(lambda: count_csv_rows(path))
+            assert n_counted == expected == n_rows, (n_counted, expected, n_rows)
+            print(
+                f"{n_rows:>10} {pandas_time * 1e3:>15.2f} {count_time * 1e3:>20.2f} {pandas_time / count_time:>7.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10_000, 50_000, 200_000]
+    main(sizes)
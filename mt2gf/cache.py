@@ -0,0 +1,147 @@
+"""
+Cache of the forms results: a typed, columnar (Arrow) copy of each results csv is written next to it
+and memory-mapped when read, the most recently read forms being kept in memory.
+pyarrow is optional: without it, the results are parsed with pandas and only cached in memory.
+"""
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from time import monotonic
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    from pyarrow import csv as pa_csv
+except ImportError:
+    pa = None
+
+# schema metadata key of the Arrow copies: size and modification time of the csv they were built from
+SIGNATURE_KEY = b"mt2gf_signature"
+
+
+class ResultsCache:
+    """
+    LRU cache of the forms results. An entry is served as is for ttl seconds after being loaded,
+    then reloaded: the results are only parsed again if the csv changed in the meantime.
+    """
+
+    def __init__(self, cache_dir, ttl=60, max_entries=16):
+        """
+        Args:
+            cache_dir (str): directory where to store the Arrow copies of the results
+            ttl (float): time in seconds during which a loaded entry is served without checking for new results
+            max_entries (int): number of forms results kept in memory
+        """
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # key -> (signature of the csv, time of the load, pa.Table or pd.DataFrame)
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Return the results loaded less than ttl seconds ago for key, None otherwise
+
+        Returns:
+            [pd.DataFrame]: results
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or monotonic() - entry[1] >= self.ttl:
+                return None
+            self.entries.move_to_end(key)
+        return self.__to_pandas(entry[2])
+
+    def load(self, key, csv_path):
+        """
+        Load the results of the csv at csv_path under key, parsing it only if it changed since it was last loaded
+
+        Args:
+            key (int): index of the form
+            csv_path (str): path to the results csv
+
+        Returns:
+            [pd.DataFrame]: results
+        """
+        csv_path = Path(csv_path)
+        stat = csv_path.stat()
+        signature = f"{stat.st_size}:{stat.st_mtime_ns}"
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry is not None and entry[0] == signature:
+            data = entry[2]
+        else:
+            data = self.__read(key, csv_path, signature)
+        with self.lock:
+            self.entries[key] = (signature, monotonic(), data)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return self.__to_pandas(data)
+
+    def invalidate(self, key=None):
+        """
+        Drop the in-memory entry of key, or all of them if key is None
+        """
+        with self.lock:
+            if key is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(key, None)
+
+    def __read(self, key, csv_path, signature):
+        """
+        Helper function for ResultsCache.load: read the Arrow copy of the csv, (re)building it if outdated
+        """
+        if pa is None:
+            return pd.read_csv(csv_path)
+        arrow_path = self.cache_dir.joinpath(f"{key}.arrow")
+        if arrow_path.exists():
+            table = self.__map(arrow_path)
+            if (table.schema.metadata or {}).get(SIGNATURE_KEY) == signature.encode():
+                return table
+        table = self.__parse(csv_path)
+        table = table.replace_schema_metadata({SIGNATURE_KEY: signature})
+        # write then rename: the tables already mapped keep reading the former version
+        tmp_path = arrow_path.with_suffix(f".{threading.get_ident()}.tmp")
+        with pa.OSFile(str(tmp_path), "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, arrow_path)
+        return self.__map(arrow_path)
+
+    def __parse(self, csv_path):
+        """
+        Helper function for ResultsCache.load: parse the csv with the conventions of pd.read_csv, that is,
+        empty fields are missing values, dates are kept as strings and empty columns are floats.
+        """
+        convert_options = pa_csv.ConvertOptions(strings_can_be_null=True)
+        table = pa_csv.read_csv(csv_path, convert_options=convert_options)
+        column_types = {}
+        for field in table.schema:
+            if pa.types.is_temporal(field.type):
+                column_types[field.name] = pa.string()
+            elif pa.types.is_null(field.type):
+                column_types[field.name] = pa.float64()
+        if len(column_types) > 0:
+            convert_options.column_types = column_types
+            table = pa_csv.read_csv(csv_path, convert_options=convert_options)
+        return table
+
+    def __map(self, arrow_path):
+        """
+        Helper function for ResultsCache.load: memory-map the Arrow file, without copying its buffers
+        """
+        return pa.ipc.open_file(pa.memory_map(str(arrow_path), "r")).read_all()
+
+    def __to_pandas(self, data):
+        """
+        Helper function for ResultsCache.load: convert the cached results to a pd.DataFrame the caller can modify
+        """
+        if pa is not None and isinstance(data, pa.Table):
+            return data.to_pandas()
+        return data.copy()
@@ -0,0 +1,99 @@
+"""
+Rule engine deciding which assignments need to be rejected: the rules are evaluated at once
+over the concatenation of the forms results and of the submitted assignments of any number of HITs.
+"""
+import numpy as np
+import pandas as pd
+
+CONF_CODE_FEEDBACK = "Invalid confirmation code."
+MISSING_FROM_FORM_FEEDBACK = (
+    "Your Worker Id was not present in the form/Incorrectly spelled."
+)
+
+
+def conf_code_rule(conf_codes):
+    """
+    Rule rejecting the assignments whose confirmation code differs from the one of their form
+
+    Args:
+        conf_codes (dict): mapping each form index to its true confirmation code
+
+    Returns:
+        [func]: rule, cf evaluate_rules
+    """
+
+    def rule(forms_df, assignments_df):
+        true_codes = assignments_df["FormIdx"].map(conf_codes)
+        return assignments_df["ConfCode"] != true_codes
+
+    return rule
+
+
+def missing_from_form_rule(forms_df, assignments_df):
+    """
+    Rule rejecting the workers who entered a confirmation code but are not present in the data of their form:
+    prevents workers from sharing the completion code. Cf evaluate_rules
+    """
+    form_workers = pd.MultiIndex.from_arrays(
+        [forms_df["FormIdx"], forms_df["WorkerID"]]
+    )
+    assignment_workers = pd.MultiIndex.from_arrays(
+        [assignments_df["FormIdx"], assignments_df["WorkerId"]]
+    )
+    return pd.Series(
+        ~assignment_workers.isin(form_workers), index=assignments_df.index
+    )
+
+
+def per_form_callback(callback):
+    """
+    Adapter turning a per-HIT frauder callback into a rule: the callback is called on the results
+    of each form (as returned by mt2gf.Turker.get_results) and returns the set of Worker IDs to reject for this form.
+
+    Args:
+        callback (func): frauder callback, cf mt2gf.Turker
+
+    Returns:
+        [func]: rule, cf evaluate_rules
+    """
+
+    def rule(forms_df, assignments_df):
+        frauders = []
+        for form_idx, form_df in forms_df.groupby("FormIdx", sort=False):
+            form_df = form_df.drop(columns="FormIdx").reset_index(drop=True)
+            frauders += [(form_idx, worker_id) for worker_id in callback(form_df)]
+        assignment_workers = pd.MultiIndex.from_arrays(
+            [assignments_df["FormIdx"], assignments_df["WorkerId"]]
+        )
+        return pd.Series(
+            assignment_workers.isin(frauders), index=assignments_df.index
+        )
+
+    return rule
+
+
+def evaluate_rules(forms_df, assignments_df, rules):
+    """
+    Evaluate the rules over all the assignments at once
+
+    Args:
+        forms_df (pd.DataFrame): concatenation of the forms results, with a FormIdx column
+        assignments_df (pd.DataFrame): submitted assignments with AssignmentId, WorkerId, HITId, FormIdx and ConfCode columns
+        rules (list of (func, str)): rules and the feedback sent to the workers they reject. Each rule takes
+        forms_df and assignments_df as arguments and returns a boolean pd.Series aligned on assignments_df,
+        True for the assignments to reject.
+
+    Returns:
+        [pd.DataFrame]: decision table with columns AssignmentId, WorkerId, HITId, FormIdx, reject and reasons
+        (feedback of every rule rejecting the assignment, one per line)
+    """
+    assignments_df = assignments_df.reset_index(drop=True)
+    reasons = pd.Series("", index=assignments_df.index, dtype=object)
+    for rule, feedback in rules:
+        rejected = rule(forms_df, assignments_df).to_numpy(dtype=bool)
+        reasons = reasons + np.where(rejected, feedback + "\n", "")
+
+    decisions = assignments_df[["AssignmentId", "WorkerId", "HITId", "FormIdx"]].copy()
+    decisions["reject"] = reasons != ""
+    decisions["reasons"] = reasons
+    return decisions
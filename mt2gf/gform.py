@@ -1,7 +1,12 @@
+import csv
 import io
 import os
 import pickle as pk
 import shutil
+import threading
+import time
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from pdb import set_trace
 
@@ -11,6 +16,23 @@ from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
 from googleapiclient.http import MediaIoBaseDownload
 
+from mt2gf.utils import count_csv_rows, load_json, save_json
+
+# name of the file storing the drive metadata of the downloaded spreadsheets in a result directory
+DRIVE_META_FILENAME = ".drive_meta.json"
+# name of the file storing the number of rows of the downloaded spreadsheets in a result directory
+DRIVE_ROWS_FILENAME = ".drive_rows.json"
+# name of the file storing the state of the drive changes feed for a result directory
+DRIVE_CHANGES_FILENAME = ".drive_changes.json"
+# suffix of the file indexing a local gform_map file, cf GformMap
+GFORM_MAP_INDEX_SUFFIX = ".index.json"
+# version of the Google APIs used, whose discovery documents are bundled with googleapiclient
+API_VERSIONS = {"drive": "v3", "sheets": "v4"}
+# the Turker and the Watcher thread can update the same metadata files
+drive_meta_lock = threading.Lock()
+# lock of each (result directory, drive id), held from the read of its row count to the save of the new one
+form_locks = {}
+
 
 def get_drive_service(creds_dir):
     """
@@ -24,6 +46,20 @@ def get_drive_service(creds_dir):
     Returns:
         [googleapiclient.discovery.Resource]: service object to Google Drive
     """
+    return DriveServiceFactory.from_creds_dir(creds_dir).get("drive")
+
+
+def get_credentials(creds_dir):
+    """
+    Load the Google credentials stored in creds_dir, refreshing them if expired. If there are none,
+    let the user log in and store them.
+
+    Args:
+        creds_dir (pathlib.Path): cf get_drive_service
+
+    Returns:
+        [google.oauth2.credentials.Credentials]: valid credentials
+    """
     # directory cleaning
     creds_dir = Path(creds_dir) if type(creds_dir) == str else creds_dir
     token_path = creds_dir.joinpath("token.pk")
@@ -49,9 +85,144 @@ def get_drive_service(creds_dir):
         # Save the credentials for the next run
         with open(token_path, "wb") as token:
             pk.dump(creds, token)
+    return creds
+
+
+class DriveServiceFactory:
+    """
+    Build the Google services (Drive, Sheets) of a run from a single set of credentials: the credentials are
+    loaded/refreshed once and shared by all the services, which are built from the discovery documents bundled
+    with googleapiclient (no request at build time).
+    The httplib2 transport behind a service is not thread-safe: each thread gets its own services, built on
+    first use then reused, cf DriveServiceFactory.get
+    The factory and the services it returned remain registered until DriveServiceFactory.close is called,
+    a service built elsewhere (or used after close) gets a factory of its own credentials, cf get_service_factory
+    """
+
+    # factory of each registered service, by id of the service, cf get_service_factory
+    factories = {}
+    factories_lock = threading.Lock()
+
+    def __init__(self, credentials):
+        """
+        Args:
+            credentials (google.oauth2.credentials.Credentials): credentials shared by the services
+        """
+        self.credentials = credentials
+        # (thread ident, api) -> service, or id -> service built elsewhere. The services are referenced until close:
+        # their ids remain valid keys of DriveServiceFactory.factories, and a new thread reusing the ident of a
+        # finished one reuses its services
+        self.services = {}
+
+    @classmethod
+    def from_creds_dir(cls, creds_dir):
+        """
+        Return the factory of the credentials stored in creds_dir, cf get_credentials
+        """
+        return cls(get_credentials(creds_dir))
+
+    def build(self, api="drive"):
+        """
+        Build a new service, neither pooled nor registered (cf DriveServiceFactory.get)
+
+        Args:
+            api (str): "drive" or "sheets"
 
-    service = build("drive", "v3", credentials=creds)
-    return service
+        Returns:
+            [googleapiclient.discovery.Resource]: service object to the Google API
+        """
+        return build(
+            api,
+            API_VERSIONS[api],
+            credentials=self.credentials,
+            static_discovery=True,
+            cache_discovery=False,
+        )
+
+    def get(self, api="drive"):
+        """
+        Return the service of the calling thread, built on its first call
+
+        Args:
+            api (str): "drive" or "sheets"
+
+        Returns:
+            [googleapiclient.discovery.Resource]: service object to the Google API
+        """
+        key = (threading.get_ident(), api)
+        with DriveServiceFactory.factories_lock:
+            service = self.services.get(key)
+        if service is None:
+            service = self.build(api)
+            self.register(service, key)
+        return service
+
+    def register(self, service, key=None):
+        """
+        Map the service to the factory until close, cf get_service_factory
+
+        Args:
+            service (googleapiclient.discovery.Resource): service sharing the credentials of the factory
+            key (tuple): (thread ident, api) if the service is the one of a thread, cf DriveServiceFactory.get
+        """
+        with DriveServiceFactory.factories_lock:
+            self.services[id(service) if key is None else key] = service
+            DriveServiceFactory.factories[id(service)] = self
+
+    def close(self):
+        """
+        Unregister the factory and drop its services: the services it returned can no longer be cloned
+        """
+        with DriveServiceFactory.factories_lock:
+            for service in self.services.values():
+                DriveServiceFactory.factories.pop(id(service), None)
+            self.services.clear()
+
+
+def get_service_factory(service):
+    """
+    Return the factory which built the provided service, cf DriveServiceFactory. A service built elsewhere
+    (e.g. with googleapiclient.discovery.build) gets a new factory sharing its credentials.
+
+    Args:
+        service (googleapiclient.discovery.Resource): as returned by get_drive_service
+
+    Returns:
+        [DriveServiceFactory]: factory of the services of the run
+    """
+    with DriveServiceFactory.factories_lock:
+        factory = DriveServiceFactory.factories.get(id(service))
+    if factory is None:
+        factory = DriveServiceFactory(service._http.credentials)
+        factory.register(service)
+    return factory
+
+
+def clone_drive_service(service):
+    """
+    Return the drive service of the calling thread sharing the credentials of the provided one.
+    The httplib2 transport behind a service is not thread-safe: each thread must use its own service.
+
+    Args:
+        service (googleapiclient.discovery.Resource): as returned by get_drive_service
+
+    Returns:
+        [googleapiclient.discovery.Resource]: service object to Google Drive
+    """
+    return get_service_factory(service).get("drive")
+
+
+def get_sheets_service(service):
+    """
+    Return the sheets service of the calling thread sharing the credentials of the provided drive service.
+
+    Args:
+        service (googleapiclient.discovery.Resource): as returned by get_drive_service
+
+    Returns:
+        [googleapiclient.discovery.Resource]: service object to Google Sheets
+    """
+    return get_service_factory(service).get("sheets")
 
 
 def download_drive_txt(gform_map_path, gform_map_id, service):
@@ -84,6 +255,8 @@ def get_gform_map(service, gform_map_id, gform_map_path):
     Return the gform_map,i.e. a dictionary mapping to each form index the url to the corresponding
     form ('url' key) and the drive id pointing to the spreadsheet containing the results of this form
     ('driveid' key).
+    The gform_map file is only downloaded again when its drive version changed, and its entries are
+    parsed lazily, cf GformMap.
 
     Args:
         service (googleapiclient.discovery.Resource): as returned by get_drive_service
@@ -92,19 +265,29 @@ def get_gform_map(service, gform_map_id, gform_map_path):
         gform_map_path (str): path where to store a local version of the gform_map.txt file
 
     Returns:
-        [dict]: dictionary mapping to each form index the url to the corresponding
+        [GformMap]: read-only dictionary mapping to each form index the url to the corresponding
         form ('url' key) and the drive id pointing to the spreadsheet containing the results of this form
         ('driveid' key).
     """
-    download_drive_txt(
-        gform_map_path, gform_map_id, service
-    )  # download the most recent url_index
-    gform_map = pd.read_csv(
-        gform_map_path, sep=",", header=None, names=["url", "driveid"]
+    gform_map_path = Path(gform_map_path)
+    index_path = gform_map_path.with_name(gform_map_path.name + GFORM_MAP_INDEX_SUFFIX)
+    index = load_json(index_path) or {}
+    version = (
+        service.files().get(fileId=gform_map_id, fields="version").execute()["version"]
     )
-    gform_map["driveid"] = gform_map["driveid"].apply(lambda x: x.split("/")[-2])
-    gform_map = gform_map.to_dict(orient="index")
-    return gform_map
+    cached = [index.get("driveid"), index.get("version")] == [gform_map_id, version]
+    if not cached or not gform_map_path.exists():
+        # download the most recent url_index
+        download_drive_txt(gform_map_path, gform_map_id, service)
+        offsets = GformMap.index_offsets(gform_map_path)
+        index = {
+            "driveid": gform_map_id,
+            "version": version,
+            "forms": list(offsets),
+            "offsets": list(offsets.values()),
+        }
+        save_json(index_path, index)
+    return GformMap(gform_map_path, dict(zip(index["forms"], index["offsets"])))
 
 
 def get_batch_gform_map(service, file_id, gform_map_path, form_indexes):
@@ -120,13 +303,71 @@ def get_batch_gform_map(service, file_id, gform_map_path, form_indexes):
         form_indexes (list of int): indexes of the forms for the current batch
     """
     gform_map = get_gform_map(service, file_id, gform_map_path)
-    # we limit the forms we want to treat to the one of the batch
-    gform_map_batch = {
-        key: value for key, value in gform_map.items() if key in form_indexes
-    }
+    # we limit the forms we want to treat to the one of the batch: only their entries are parsed
+    gform_map_batch = {key: gform_map[key] for key in form_indexes if key in gform_map}
     return gform_map_batch
 
 
+class GformMap(Mapping):
+    """
+    Read-only dictionary view of a local gform_map file, indexed by form index: each entry is
+    parsed from its line of the file the first time it is accessed.
+    """
+
+    def __init__(self, gform_map_path, offsets):
+        """
+        Args:
+            gform_map_path (str): path to the local gform_map file
+            offsets (dict): mapping each form index to the byte offset of its line, cf GformMap.index_offsets
+        """
+        self.gform_map_path = Path(gform_map_path)
+        self.offsets = offsets
+        self.entries = {}
+
+    @staticmethod
+    def index_offsets(gform_map_path):
+        """
+        Return the byte offset of the line of each form in the gform_map file. The lines are
+        <form index>,<url to form>,<url to form spreadsheet>, or <url to form>,<url to form spreadsheet>
+        in which case the form index is the number of the line (blank lines excluded).
+
+        Returns:
+            [dict]: mapping each form index to the byte offset of its line
+        """
+        offsets = {}
+        offset = 0
+        with open(gform_map_path, "rb") as f:
+            for line in f:
+                if len(line.strip()) > 0:
+                    row = next(csv.reader([line.decode()]))
+                    key = int(row[0]) if len(row) > 2 else len(offsets)
+                    offsets[key] = offset
+                offset += len(line)
+        return offsets
+
+    def __getitem__(self, form_idx):
+        if form_idx not in self.entries:
+            offset = self.offsets[form_idx]
+            with open(self.gform_map_path, "rb") as f:
+                f.seek(offset)
+                row = next(csv.reader([f.readline().decode()]))
+            url, sheet_url = row[-2:]
+            self.entries[form_idx] = {"url": url, "driveid": sheet_url.split("/")[-2]}
+        return self.entries[form_idx]
+
+    def __iter__(self):
+        return iter(self.offsets)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __contains__(self, form_idx):
+        return form_idx in self.offsets
+
+    def __repr__(self):
+        return f"GformMap({self.gform_map_path}, {len(self)} forms)"
+
+
 def download_csv(csv_path, fileId, service, verbose=False):
     """
     Download the spreadsheet result of a form as a csv file
@@ -149,10 +390,231 @@ def download_csv(csv_path, fileId, service, verbose=False):
         raise ValueError("Empty file")
 
 
-def download_multi_csv(gform_map, result_dir, service):
+def download_csv_rows(csv_path, fileId, sheets_service, n_rows):
     """
-    Iterate over the forms present in the gform_map and sequentially calls download_csv
-    on, downloading their respective most recent version
+    Append to the local csv version of a spreadsheet the rows following its n_rows first ones.
+    Form responses only get appended to their spreadsheet: the rows already present locally are
+    not downloaded again. Nothing is appended if the header of the spreadsheet differs from the local
+    one (e.g. a question was added to the form): the spreadsheet must then be downloaded again.
+
+    Args:
+        csv_path(str): path to the local .csv version of the spreadsheet, holding its header and n_rows rows
+        fileId (str): drive id of the spreadsheet
+        sheets_service (googleapiclient.discovery.Resource]): as returned by get_sheets_service
+        n_rows (int): number of rows (header excluded) present in the local csv
+
+    Returns:
+        [int]: number of rows appended, None if the headers differ
+    """
+    # the first row of the sheet is the header
+    response = (
+        sheets_service.spreadsheets()
+        .values()
+        .batchGet(spreadsheetId=fileId, ranges=["A1:ZZZ1", f"A{n_rows + 2}:ZZZ"])
+        .execute()
+    )
+    header_range, rows_range = response["valueRanges"]
+    sheet_header = header_range.get("values", [[]])[0]
+    rows = rows_range.get("values", [])
+    with open(csv_path, "r", newline="") as f:
+        header = next(csv.reader(f))
+    # trailing empty cells are omitted by the Sheets API
+    if sheet_header + [""] * (len(header) - len(sheet_header)) != header:
+        return None
+    if len(rows) == 0:
+        return 0
+
+    with open(csv_path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        f.seek(max(f.tell() - 1, 0))
+        ends_with_newline = f.read() == b"\n"
+
+    with open(csv_path, "a", newline="") as f:
+        if not ends_with_newline:
+            f.write("\r\n")
+        writer = csv.writer(f)
+        for row in rows:
+            # trailing empty cells are omitted by the Sheets API
+            writer.writerow(row + [""] * (len(header) - len(row)))
+    return len(rows)
+
+
+def get_files_metadata(driveids, service, batch_size=100):
+    """
+    Fetch the modifiedTime and version of the given drive files, grouping the requests in batches.
+
+    Args:
+        driveids (list of str): drive ids of the files
+        service (googleapiclient.discovery.Resource]): as returned by get_drive_service
+        batch_size (int): number of requests per batch (at most 100)
+
+    Returns:
+        [dict]: mapping each drive id to a {'modifiedTime','version'} dictionary. Files whose
+        metadata could not be retrieved are absent.
+    """
+    metadata = {}
+
+    def callback(request_id, response, exception):
+        if exception is None:
+            metadata[request_id] = {
+                "modifiedTime": response["modifiedTime"],
+                "version": response["version"],
+            }
+
+    driveids = list(driveids)
+    for start in range(0, len(driveids), batch_size):
+        batch = service.new_batch_http_request(callback=callback)
+        for driveid in driveids[start : start + batch_size]:
+            request = service.files().get(
+                fileId=driveid, fields="id,modifiedTime,version"
+            )
+            batch.add(request, request_id=driveid)
+        batch.execute()
+    return metadata
+
+
+def load_drive_meta(result_dir, filename=DRIVE_META_FILENAME):
+    """
+    Load the drive metadata of the spreadsheets downloaded in result_dir
+
+    Args:
+        result_dir (str): directory where the results are downloaded
+        filename (str): DRIVE_META_FILENAME for the drive versions, DRIVE_ROWS_FILENAME for the numbers of rows
+
+    Returns:
+        [dict]: mapping each drive id to its metadata at the time of its last download
+    """
+    return load_json(Path(result_dir).joinpath(filename)) or {}
+
+
+def save_drive_meta(result_dir, drive_meta, filename=DRIVE_META_FILENAME):
+    """
+    Save the drive metadata of the spreadsheets downloaded in result_dir. Cf load_drive_meta
+    """
+    save_json(Path(result_dir).joinpath(filename), drive_meta)
+
+
+class DriveChangeTracker:
+    """
+    Follow the Drive changes feed to find which spreadsheets changed since they were last downloaded
+    in a result directory, with a single changes().list call per synchronization.
+
+    The state (result_dir/.drive_changes.json) holds the page token of the feed, the drive ids downloaded
+    under the tracker's watch ('tracked') and the changes not downloaded yet ('pending', mapping each drive
+    id to the number of the poll which reported it).
+    """
+
+    def __init__(self, service, result_dir):
+        """
+        Args:
+            service (googleapiclient.discovery.Resource): as returned by get_drive_service
+            result_dir (str): directory where the results are downloaded
+        """
+        self.service = service
+        self.state_path = Path(result_dir).joinpath(DRIVE_CHANGES_FILENAME)
+        self.poll_number = 0
+
+    def changed_ids(self, driveids):
+        """
+        Return the drive ids among driveids that need to be downloaded: those which changed
+        since their last download, and those never downloaded under the tracker's watch.
+
+        Args:
+            driveids (list of str): drive ids of the spreadsheets to synchronize
+
+        Returns:
+            [set of str]: drive ids to download
+        """
+        with drive_meta_lock:
+            state = self.__load_state()
+            tracked = set(state["tracked"])
+            pending = state["pending"]
+            state["poll_number"] += 1
+            self.poll_number = state["poll_number"]
+            if state["page_token"] is None:
+                # start following the feed before the first download so that no change is missed
+                response = self.service.changes().getStartPageToken().execute()
+                state["page_token"] = response["startPageToken"]
+            else:
+                page_token = state["page_token"]
+                while page_token is not None:
+                    response = (
+                        self.service.changes()
+                        .list(
+                            pageToken=page_token,
+                            pageSize=1000,
+                            spaces="drive",
+                            fields="nextPageToken,newStartPageToken,changes(fileId)",
+                        )
+                        .execute()
+                    )
+                    for change in response["changes"]:
+                        pending[change["fileId"]] = self.poll_number
+                    page_token = response.get("nextPageToken")
+                    state["page_token"] = response.get(
+                        "newStartPageToken", state["page_token"]
+                    )
+            # only the changes of the other files of the feed are irrelevant. A file of driveids not tracked
+            # yet keeps its changes: another caller may be downloading it, and acknowledge only clears
+            # the changes reported before its download
+            driveids = set(driveids)
+            state["pending"] = {
+                driveid: poll
+                for driveid, poll in pending.items()
+                if driveid in tracked or driveid in driveids
+            }
+            self.__save_state(state)
+        return (driveids & set(pending)) | (driveids - tracked)
+
+    def acknowledge(self, driveids):
+        """
+        Mark the given drive ids as downloaded in the version reported by the last call to changed_ids.
+        Changes reported since (e.g. by another consumer of the same result directory) remain pending.
+
+        Args:
+            driveids (list of str): drive ids of the spreadsheets downloaded
+        """
+        with drive_meta_lock:
+            state = self.__load_state()
+            state["tracked"] = sorted(set(state["tracked"]) | set(driveids))
+            for driveid in driveids:
+                if state["pending"].get(driveid, self.poll_number + 1) <= self.poll_number:
+                    del state["pending"][driveid]
+            self.__save_state(state)
+
+    def __load_state(self):
+        state = load_json(self.state_path)
+        if state is None:
+            return {"page_token": None, "poll_number": 0, "tracked": [], "pending": {}}
+        return state
+
+    def __save_state(self, state):
+        save_json(self.state_path, state)
+
+
+def get_form_lock(result_dir, driveid):
+    """
+    Return the lock of the local csv of the spreadsheet driveid in result_dir, cf download_multi_csv
+    """
+    key = (str(Path(result_dir).resolve()), driveid)
+    with drive_meta_lock:
+        return form_locks.setdefault(key, threading.Lock())
+
+
+def download_multi_csv(
+    gform_map, result_dir, service, max_workers=1, sync_mode="full", incremental=False
+):
+    """
+    Iterate over the forms present in the gform_map and calls download_csv
+    on, downloading their respective most recent version.
+    A failed download does not interrupt the others: it is reported in the returned dataframe.
+
+    With sync_mode="metadata", the modifiedTime/version of every spreadsheet is fetched in batched
+    requests and compared with the one recorded (in result_dir/.drive_meta.json) at its last download:
+    only the spreadsheets that changed since are exported again.
+    With sync_mode="changes", the spreadsheets to export are found with a single call to the Drive
+    changes feed, cf DriveChangeTracker.
+    With incremental=True, the forms already downloaded only get their new rows appended, cf download_csv_rows.
 
     Args:
         gform_map (dict): dictionary mapping to each form index the url to the corresponding
@@ -160,8 +622,148 @@ def download_multi_csv(gform_map, result_dir, service):
         ('driveid' key).
         result_dir (str): directory where to download the results.
         service (googleapiclient.discovery.Resource]): as returned by get_drive_service
+        max_workers (int): number of forms downloaded concurrently, each thread using its own drive service
+        (cf clone_drive_service). Set to 1 to download them sequentially.
+        sync_mode (str): "full" to download every form, "metadata" or "changes" to download only the forms whose
+        spreadsheet changed since their last download.
+        incremental (Bool): if set to True, fetch through the Sheets API only the rows absent from the local csv
+        (whose number is recorded in result_dir/.drive_rows.json at each download). Edits of rows already downloaded
+        are not fetched, and a form whose questions changed is downloaded again.
+
+    Returns:
+        [pd.DataFrame]: indexed by FormIdx, with columns driveid, downloaded (False if the form was
+        skipped as unchanged), rows (number of rows of the local csv), seconds (download duration)
+        and error (None if the download succeeded)
     """
+    if sync_mode not in ["full", "metadata", "changes"]:
+        raise ValueError(f"Unknown sync_mode {sync_mode}")
     result_dir = Path(result_dir)
-    for idx, driveid in [(idx, val["driveid"]) for idx, val in gform_map.items()]:
-        path = result_dir.joinpath(f"{idx}.csv")
-        download_csv(path, driveid, service)
+    forms = [(idx, val["driveid"]) for idx, val in gform_map.items()]
+    # each thread uses its own services (e.g. the Watcher thread), cf clone_drive_service
+    forms, unchanged_forms, sync_state = select_changed_forms(
+        forms, result_dir, clone_drive_service(service), sync_mode
+    )
+    report = [
+        {"FormIdx": idx, "driveid": driveid, "downloaded": False}
+        for idx, driveid in unchanged_forms
+    ]
+
+    def download(form):
+        return download_form(*form, result_dir, service, incremental)
+
+    if max_workers > 1:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            report += list(executor.map(download, forms))
+    else:
+        report += [download(form) for form in forms]
+    record_downloads(report, result_dir, sync_mode, sync_state)
+
+    report = pd.DataFrame(
+        report, columns=["FormIdx", "driveid", "downloaded", "rows", "seconds", "error"]
+    ).set_index("FormIdx")
+    return report.sort_index()
+
+
+def select_changed_forms(forms, result_dir, service, sync_mode):
+    """
+    Helper function for download_multi_csv: split the forms into the ones to download and the ones
+    unchanged since their last download, cf sync_mode
+
+    Args:
+        forms (list of tuple): (form index, drive id) of the forms to synchronize
+        result_dir (pathlib.Path): directory where the results are downloaded
+        service (googleapiclient.discovery.Resource]): drive service of the calling thread
+        sync_mode (str): cf download_multi_csv
+
+    Returns:
+        [list of tuple],[list of tuple],[dict or DriveChangeTracker]: forms to download, unchanged forms, and
+        the drive metadata ("metadata") or the tracker ("changes") to record the downloads with, cf record_downloads
+    """
+    if sync_mode == "full":
+        return forms, [], None
+    if sync_mode == "metadata":
+        sync_state = get_files_metadata([driveid for _, driveid in forms], service)
+        with drive_meta_lock:
+            local_meta = load_drive_meta(result_dir)
+        changed_ids = {
+            driveid
+            for _, driveid in forms
+            if driveid not in sync_state or local_meta.get(driveid) != sync_state[driveid]
+        }
+    else:
+        sync_state = DriveChangeTracker(service, result_dir)
+        changed_ids = sync_state.changed_ids([driveid for _, driveid in forms])
+    changed_forms = []
+    unchanged_forms = []
+    for idx, driveid in forms:
+        if driveid in changed_ids or not result_dir.joinpath(f"{idx}.csv").exists():
+            changed_forms.append((idx, driveid))
+        else:
+            unchanged_forms.append((idx, driveid))
+    return changed_forms, unchanged_forms, sync_state
+
+
+def download_form(idx, driveid, result_dir, service, incremental):
+    """
+    Helper function for download_multi_csv: download the results of a form and record their number of rows
+
+    Returns:
+        [dict]: row of the report of download_multi_csv
+    """
+    path = result_dir.joinpath(f"{idx}.csv")
+    error = None
+    rows = None
+    start = time.perf_counter()
+    try:
+        # a form synchronized concurrently (e.g. by the Watcher thread) would get its rows appended twice
+        with get_form_lock(result_dir, driveid):
+            with drive_meta_lock:
+                n_rows = load_drive_meta(result_dir, DRIVE_ROWS_FILENAME).get(driveid)
+            if incremental and n_rows is not None and path.exists():
+                appended = download_csv_rows(
+                    path, driveid, get_sheets_service(service), n_rows
+                )
+                rows = None if appended is None else n_rows + appended
+            if rows is None:
+                download_csv(path, driveid, clone_drive_service(service))
+                rows = count_csv_rows(path)
+            with drive_meta_lock:
+                row_counts = load_drive_meta(result_dir, DRIVE_ROWS_FILENAME)
+                row_counts[driveid] = rows
+                save_drive_meta(result_dir, row_counts, DRIVE_ROWS_FILENAME)
+    except Exception as err:
+        print(f"Failed to download form {idx}: {err}")
+        error = str(err)
+    seconds = time.perf_counter() - start
+    return {
+        "FormIdx": idx,
+        "driveid": driveid,
+        "downloaded": True,
+        "rows": rows,
+        "seconds": seconds,
+        "error": error,
+    }
+
+
+def record_downloads(report, result_dir, sync_mode, sync_state):
+    """
+    Helper function for download_multi_csv: record the version of the spreadsheets successfully downloaded
+
+    Args:
+        report (list of dict): rows of the report of download_multi_csv
+        result_dir (pathlib.Path): directory where the results are downloaded
+        sync_mode (str): cf download_multi_csv
+        sync_state (dict or DriveChangeTracker): as returned by select_changed_forms
+    """
+    downloaded = [
+        row["driveid"] for row in report if row["downloaded"] and row["error"] is None
+    ]
+    if sync_mode == "metadata":
+        with drive_meta_lock:
+            local_meta = load_drive_meta(result_dir)
+            for driveid in downloaded:
+                if driveid in sync_state:
+                    local_meta[driveid] = sync_state[driveid]
+            save_drive_meta(result_dir, local_meta)
+    elif sync_mode == "changes":
+        sync_state.acknowledge(downloaded)
@@ -4,23 +4,53 @@ pointing to Google forms as describe in the README.
 
 
 """
-import pickle as pk
+import hashlib
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from pathlib import Path
+from time import sleep
 
 import boto3
+from botocore.exceptions import ClientError
 import pandas as pd
 import pytz
 import xmltodict
 
-from mt2gf.gform import download_csv, download_multi_csv
-from mt2gf.utils import read_access_keys
-
-# from mt2gf.fraudulous import detect_repeat_frauders,detect_honey_frauders
+from mt2gf.cache import ResultsCache
+from mt2gf.fraudulous import (
+    CONF_CODE_FEEDBACK,
+    MISSING_FROM_FORM_FEEDBACK,
+    conf_code_rule,
+    evaluate_rules,
+    missing_from_form_rule,
+    per_form_callback,
+)
+from mt2gf.gform import download_multi_csv
+from mt2gf.store import HitFormMap, StateStore
+from mt2gf.utils import read_access_keys, run_pipeline
 
 
 utc = pytz.UTC
 
+# QuestionFormAnswers made of a single FreeText answer (layout of the HIT template) without XML entities
+SINGLE_FREETEXT_ANSWER = re.compile(
+    r"\s*(?:<\?xml[^>]*\?>)?\s*<QuestionFormAnswers[^>]*>\s*<Answer>"
+    r"\s*<QuestionIdentifier>([^<&]*)</QuestionIdentifier>\s*<FreeText>([^<&]*)</FreeText>"
+    r"\s*</Answer>\s*</QuestionFormAnswers>\s*"
+)
+
+# error codes returned by MTurk when the request rate is exceeded
+THROTTLING_ERROR_CODES = [
+    "Throttling",
+    "ThrottlingException",
+    "TooManyRequestsException",
+    "ServiceUnavailable",
+]
+
+# meta key of the time of the last synchronization of the assignments cache, cf Turker.sync_assignments
+ASSIGNMENTS_SYNCED_AT = "assignments_synced_at"
+
 
 def create_mturk_client(aws_access_key_id, aws_secret_access_key, production=False):
     """
@@ -62,15 +92,274 @@ def create_mturk_client(aws_access_key_id, aws_secret_access_key, production=Fal
     return client
 
 
+def is_throttling_error(error):
+    """
+    Whether the provided error was raised because the request rate was exceeded, in which case
+    the call can be retried later.
+
+    Args:
+        error (botocore.exceptions.ClientError): error raised by a boto3 call
+
+    Returns:
+        [Bool]: True if the call was throttled
+    """
+    details = error.response.get("Error", {})
+    message = details.get("Message", "").strip().lower()
+    return details.get("Code") in THROTTLING_ERROR_CODES or message.startswith(
+        "rate exceeded"
+    )
+
+
+def is_duplicate_token_error(error):
+    """
+    Whether the provided error was raised because a HIT was already created with the same
+    UniqueRequestToken, e.g. by a run interrupted before recording it.
+
+    Args:
+        error (botocore.exceptions.ClientError): error raised by client.create_hit_with_hit_type
+
+    Returns:
+        [Bool]: True if the token was already used
+    """
+    details = error.response.get("Error", {})
+    message = details.get("Message", "").lower()
+    return details.get("Code") == "RequestError" and (
+        "uniquerequesttoken" in message or "unique request token" in message
+    )
+
+
+def call_with_retry(client_method, max_retries=5, retry_backoff=1, **kwargs):
+    """
+    Call the provided boto3 method, retrying it with an exponential backoff while it is throttled.
+
+    Args:
+        client_method (func): boto3 method, e.g. client.approve_assignment
+        max_retries (int): maximal number of retries
+        retry_backoff (float): time in seconds before the first retry, doubled at each retry
+        kwargs: arguments passed to client_method
+
+    Returns:
+        [dict]: response of client_method
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            return client_method(**kwargs)
+        except ClientError as error:
+            if not is_throttling_error(error) or attempt == max_retries:
+                raise
+            sleep(retry_backoff * 2 ** attempt)
+
+
+# columns of the review outcome tables, cf execute_review_decisions
+REVIEW_OUTCOME_COLUMNS = [
+    "AssignmentId",
+    "WorkerId",
+    "HITId",
+    "FormIdx",
+    "Reject",
+    "Feedback",
+    "Outcome",
+    "Error",
+]
+
+
+def execute_review_decisions(
+    client, decisions, max_workers=1, dry_run=False, max_retries=5, retry_backoff=1
+):
+    """
+    Send the approve_assignment/reject_assignment calls corresponding to the provided decisions,
+    max_workers at a time. Throttled calls are retried, cf call_with_retry.
+
+    Args:
+        client (boto3.client): as returned by create_mturk_client
+        decisions (list of dict): one dict per assignment with AssignmentId, WorkerId, HITId, FormIdx,
+        Reject (Bool) and Feedback (str, reason of the rejection) entries
+        max_workers (int): number of calls sent concurrently
+        dry_run (Bool): if set to True, no call is sent: the outcome table remains the same for
+        pre-checking the effect of a wet run.
+        max_retries (int): cf call_with_retry
+        retry_backoff (float): cf call_with_retry
+
+    Returns:
+        [pd.DataFrame]: one row per decision with columns AssignmentId, WorkerId, HITId, FormIdx, Reject,
+        Feedback, Outcome ("Approved", "Rejected" or "Failed") and Error (None if the call succeeded)
+    """
+
+    def execute(decision):
+        ass_id = decision["AssignmentId"]
+        action = "Reject" if decision["Reject"] else "Approve"
+        outcome = {
+            **decision,
+            "Outcome": "Rejected" if decision["Reject"] else "Approved",
+            "Error": None,
+        }
+        print(
+            f"{action} wid {decision['WorkerId']} hitid {decision['HITId']} formidx {decision['FormIdx']}"
+        )
+        if decision["Reject"]:
+            print(decision["Feedback"])
+        if dry_run:
+            return outcome
+        try:
+            if decision["Reject"]:
+                call_with_retry(
+                    client.reject_assignment,
+                    max_retries,
+                    retry_backoff,
+                    AssignmentId=ass_id,
+                    RequesterFeedback=decision["Feedback"],
+                )
+            else:
+                call_with_retry(
+                    client.approve_assignment,
+                    max_retries,
+                    retry_backoff,
+                    AssignmentId=ass_id,
+                )
+        except ClientError as error:
+            print(f"Failed to {action.lower()} assignment {ass_id}: {error}")
+            outcome["Outcome"] = "Failed"
+            outcome["Error"] = str(error)
+        return outcome
+
+    if max_workers > 1:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            outcomes = list(executor.map(execute, decisions))
+    else:
+        outcomes = [execute(decision) for decision in decisions]
+    return pd.DataFrame(outcomes, columns=REVIEW_OUTCOME_COLUMNS)
+
+
+def paginate(client_method, result_key, page_size=100, **kwargs):
+    """
+    Lazily iterate over the items returned by a paginated MTurk listing call, following
+    the NextToken of each page until the listing is exhausted.
+
+    Args:
+        client_method (func): boto3 listing method, e.g. client.list_hits
+        result_key (str): key of the response holding the items, e.g. "HITs"
+        page_size (int): number of items requested per page (MaxResults), at most 100
+        kwargs: extra arguments passed to client_method
+
+    Yields:
+        [dict]: items of the listing, one at a time
+    """
+    while True:
+        response = client_method(MaxResults=page_size, **kwargs)
+        items = response[result_key]
+        for item in items:
+            yield item
+        next_token = response.get("NextToken")
+        if next_token is None or len(items) == 0:
+            return
+        kwargs["NextToken"] = next_token
+
+
+def iter_hits(client, page_size=100):
+    """
+    Iterate over all the HITs of the account. Cf paginate
+    """
+    return paginate(client.list_hits, "HITs", page_size)
+
+
+def iter_reviewable_hits(client, page_size=100):
+    """
+    Iterate over all the HITs in a reviewable state. Cf paginate
+    """
+    return paginate(client.list_reviewable_hits, "HITs", page_size)
+
+
+def iter_assignments_for_hit(
+    client, hit_id, statuses=("Submitted", "Approved", "Rejected"), page_size=100
+):
+    """
+    Iterate over all the assignments of the given HIT. Cf paginate
+
+    Args:
+        hit_id (str): MTurk HIT id
+        statuses (list of str): assignment statuses to list
+    """
+    return paginate(
+        client.list_assignments_for_hit,
+        "Assignments",
+        page_size,
+        HITId=hit_id,
+        AssignmentStatuses=list(statuses),
+    )
+
+
+def iter_workers_with_qualification_type(client, qualification_type_id, page_size=100):
+    """
+    Iterate over all the qualifications granted for the given qualification type. Cf paginate
+    """
+    return paginate(
+        client.list_workers_with_qualification_type,
+        "Qualifications",
+        page_size,
+        QualificationTypeId=qualification_type_id,
+    )
+
+
+def parse_answer(answer):
+    """
+    Parse the answers out of an assignment answer. The single FreeText layout produced by the HIT template
+    is parsed with a regular expression, other layouts with a full XML parser.
+
+    Args:
+        answer (str): as returned by Assignment['Answer']
+
+    Returns:
+        [list of (str, str)]: QuestionIdentifier and answer of each question
+    """
+    match = SINGLE_FREETEXT_ANSWER.fullmatch(answer)
+    if match is not None:
+        return [match.groups()]
+    xml_doc = xmltodict.parse(answer)
+    answers = xml_doc["QuestionFormAnswers"]["Answer"]
+    if not isinstance(answers, list):
+        answers = [answers]
+    return [
+        (
+            answer.get("QuestionIdentifier"),
+            answer.get("FreeText", answer.get("SelectionIdentifier")),
+        )
+        for answer in answers
+    ]
+
+
+def parse_answers(assignments, cache=None):
+    """
+    Parse the answers of a list of assignments, cf parse_answer
+
+    Args:
+        assignments (list of dict): as returned by client.list_assignments_for_hit
+        cache (dict): if provided, parsed answers memoized by AssignmentId: an assignment is never parsed twice
+
+    Returns:
+        [pd.DataFrame]: one row per question and assignment with columns AssignmentId, QuestionIdentifier and Answer
+    """
+    rows = []
+    for assignment in assignments:
+        ass_id = assignment["AssignmentId"]
+        if cache is not None and ass_id in cache:
+            answers = cache[ass_id]
+        else:
+            answers = parse_answer(assignment["Answer"])
+            if cache is not None:
+                cache[ass_id] = answers
+        rows += [(ass_id, question, answer) for question, answer in answers]
+    return pd.DataFrame(rows, columns=["AssignmentId", "QuestionIdentifier", "Answer"])
+
+
 def get_answer(answer):
     """
-    Parse the text out of an answer
+    Parse the text out of an answer. If the HIT has several questions, the answer to the first one
+    is returned, cf parse_answer
 
     Args:
         answer (dict): as returned by Assignment['Answer']
     """
-    xml_doc = xmltodict.parse(answer)
-    return xml_doc["QuestionFormAnswers"]["Answer"]["FreeText"]
+    return parse_answer(answer)[0][1]
 
 
 class MTurkParam:
@@ -155,11 +444,20 @@ class Turker:
         frauder_callbacks=[],
         check_conf_code=False,
         check_code_frauders=False,
+        page_size=100,
+        max_workers=1,
+        sync_mode="metadata",
+        incremental=False,
+        batch_number=None,
+        assignments_max_age=0,
+        results_ttl=60,
+        results_cache_size=16,
     ):
         """
         Args:
             meta_dir (str): path where the Turker can create a ".mt2gf" directory to store metadata
             about the run, allowing it to reload in case of program crash/interruption.
+            The metadata is stored in an SQLite database shared with the Watcher, cf mt2gf.store.StateStore
             param (mt2gf.MTurkParam): parameter for the run, cf documentation for MTurkParam
             gservice (googleapiclient.discovery.Resource): as returned by mt2gf.auto_drive.get_drive_service
             gform_map (dict): as returned by mt2gf.auto_drive.get_gform_map or mt2gf.auto_drive.get_batch_gform_map
@@ -178,6 +476,19 @@ class Turker:
             check_code_frauders (Bool): If set to True, Turker.approve_correct_assignments and Turker.approve_correct_hits will reject any WorkerId present
             in an MTurk HIt but absent of the Google form. This makes sure that no HIT will be validated without data in the Google Form.
             NB: Worker entering a malformed ID are rejected as well
+            page_size (int): number of items requested per page when listing HITs/assignments on MTurk (at most 100)
+            max_workers (int): number of MTurk/Drive calls run concurrently by the bulk operations (e.g. Turker.list_hits,
+            Turker.create_forms_hits, forms downloads).
+            Set to 1 to run them sequentially.
+            Throttled approve/reject calls are retried, cf mt2gf.mturk.execute_review_decisions
+            sync_mode (str): how the forms results are kept up to date, cf mt2gf.gform.download_multi_csv
+            incremental (Bool): if set to True, only the new rows of the forms results are downloaded, cf mt2gf.gform.download_multi_csv
+            batch_number (int): index of the batch gform_map belongs to, if any (cf mt2gf.preprocess.get_batch_indexes)
+            assignments_max_age (float): age in seconds under which the local assignments cache is used as is by
+            Turker.list_hits, Turker.list_all_assignments and Turker.save_worker_infos, cf Turker.sync_assignments
+            results_ttl (float): time in seconds during which Turker.get_results serves the forms results from its cache
+            without checking for new responses
+            results_cache_size (int): number of forms results kept in memory, cf mt2gf.cache.ResultsCache
         """
         # Mturk Parameters
         self.p = param
@@ -188,17 +499,31 @@ class Turker:
         meta_dir = meta_dir.joinpath(".mt2gf")
         meta_dir.mkdir(exist_ok=True)
         if self.p.production:
-            self.hit2form_path = meta_dir.joinpath("hit2form.pk")
+            self.store = StateStore(meta_dir.joinpath("mt2gf.db"))
+            self.store.migrate_hit2form(meta_dir.joinpath("hit2form.pk"))
         else:
-            self.hit2form_path = meta_dir.joinpath("hit2formsandbox.pk")
+            self.store = StateStore(meta_dir.joinpath("mt2gfsandbox.db"))
+            self.store.migrate_hit2form(meta_dir.joinpath("hit2formsandbox.pk"))
+        self.hit2form = HitFormMap(self.store)
+        self.store.add_forms(gform_map, batch_number)
         self.watcher_process = None
         self.gservice = gservice
         self.gform_map = gform_map
         self.formresdir = Path(formresdir)
+        self.results_cache = ResultsCache(
+            self.formresdir.joinpath(".results_cache"), results_ttl, results_cache_size
+        )
         self.conf_code_generator = conf_code_generator
         self.frauder_callbacks = frauder_callbacks
         self.check_conf_code = conf_code_generator is not None
         self.check_code_frauders = check_code_frauders
+        self.page_size = page_size
+        self.max_workers = max_workers
+        # parsed assignment answers, by AssignmentId
+        self.answers_cache = {}
+        self.sync_mode = sync_mode
+        self.incremental = incremental
+        self.assignments_max_age = assignments_max_age
 
         # Retrieval of the access keys
         aws_access_key_id, aws_secret_access_key = read_access_keys(self.p.aws_key_path)
@@ -206,97 +531,291 @@ class Turker:
             aws_access_key_id, aws_secret_access_key, self.p.production
         )
 
-        # Creation of an Mturk client
-        if self.hit2form_path.exists():
-            self.hit2form = pk.load(open(self.hit2form_path, "rb"))
-        else:
-            self.hit2form = {}
-
         # Download a first version of the Google forms
-        download_multi_csv(gform_map, self.formresdir, gservice)
+        download_multi_csv(
+            gform_map,
+            self.formresdir,
+            gservice,
+            max_workers=self.max_workers,
+            sync_mode=self.sync_mode,
+            incremental=self.incremental,
+        )
 
     def list_reviewable_hits(self):
         """
         List the HITs in a reviwable state
         """
-        hits = [hit for hit in self.client.list_reviewable_hits()["HITs"]]
+        hits = list(iter_reviewable_hits(self.client, self.page_size))
         if len(hits) == 0:
             print("No reviewable hit available")
         return hits
 
-    def list_hits(self):
+    def list_hits(self, max_workers=None):
         """
         Published HITs informations: HITId,Status,Completed,Percent_completed
         Completed designates the number of completed forms for the given HIT.
         Once Percent_completed reaches 100, the HIT status becomes "Assignable"
 
+        The assignments are counted from the local cache, cf Turker.sync_assignments
+
+        Args:
+            max_workers (int): If value is set, overrides self.max_workers. Number of HITs whose
+            assignments are synchronized concurrently.
+
         Returns:
             [pd.DataFrame]: Dataframe with HITId,Status,Completed,Percent_completed columns
         """
-        hits = self.client.list_hits()["HITs"]
+        self.sync_assignments(max_workers=max_workers)
+        hits = self.store.get_hits()
         if len(hits) == 0:
             print("No Hits available")
+            return None
+        self.__print_expiration(hits[0])
+
+        counts = self.store.count_assignments()
+        df = []
+        for hit in hits:
+            row = {}
+            hitid = hit["HITId"]
+            comp = sum(counts.get(hitid, {}).values())
+            row["FormIdx"] = self.hit2form.get(hitid, 9999)
+            row["HITId"] = hitid
+            row["Status"] = hit["HITStatus"]
+            row["Completed"] = comp
+            maxo = hit["MaxAssignments"]
+            row["Percent_completed"] = int(comp / maxo * 100)
+            df.append(row)
+        df = pd.DataFrame(df).set_index("FormIdx").sort_index()
+        return df
+
+    def __print_expiration(self, hit):
+        """
+        Helper function for Turker.list_hits: print the expiration date of the given HIT
+        """
+        expiration = hit["Expiration"].replace(tzinfo=utc)
+        now = datetime.now().replace(tzinfo=utc)
+        if expiration < now:
+            print("EXPIRED")
         else:
-            expiration = hits[0]["Expiration"].replace(tzinfo=utc)
-            now = datetime.now().replace(tzinfo=utc)
-            if expiration < now:
-                print("EXPIRED")
-            else:
-                delay = expiration - now
-                delay = int(delay.total_seconds()) / 60
-                print(
-                    f"Expiration:{expiration.strftime('%b %d %Y %H:%M:%S')} ({delay:.2f} minutes left)"
+            delay = expiration - now
+            delay = int(delay.total_seconds()) / 60
+            print(
+                f"Expiration:{expiration.strftime('%b %d %Y %H:%M:%S')} ({delay:.2f} minutes left)"
+            )
+            print(f"{self.p.url}")
+
+    def sync_assignments(self, max_age=None, max_workers=None):
+        """
+        Update the local assignments cache (cf mt2gf.store.StateStore) with the activity on MTurk since
+        the last synchronization. The HITs are listed, and only the HITs whose counters (available, pending
+        and completed assignments) differ from the cache get their assignments requested: the Submitted ones,
+        and the Approved/Rejected ones only if some were reviewed since the last synchronization.
+
+        Args:
+            max_age (float): If value is set, overrides self.assignments_max_age. The synchronization is
+            skipped if the last one happened less than max_age seconds ago.
+            max_workers (int): If value is set, overrides self.max_workers. Number of HITs whose
+            assignments are requested concurrently.
+
+        Returns:
+            [datetime]: time of the last synchronization, that is, freshness of the cache
+        """
+        if max_age is None:
+            max_age = self.assignments_max_age
+        if max_workers is None:
+            max_workers = self.max_workers
+
+        synced_at = self.store.get_meta(ASSIGNMENTS_SYNCED_AT)
+        if synced_at is not None:
+            synced_at = datetime.fromisoformat(synced_at)
+            if (datetime.now() - synced_at).total_seconds() < max_age:
+                print(f"Assignments synced at {synced_at.strftime('%b %d %Y %H:%M:%S')}")
+                return synced_at
+
+        synced_at = datetime.now()
+        hits = list(iter_hits(self.client, self.page_size))
+        self.store.set_hits(hits)
+        counts = self.store.count_assignments()
+        stale = [hit for hit in hits if self.__is_stale(hit, counts.get(hit["HITId"], {}))]
+        if max_workers > 1:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                list(executor.map(self.__sync_hit_assignments, stale))
+        else:
+            for hit in stale:
+                self.__sync_hit_assignments(hit)
+        self.store.set_meta(ASSIGNMENTS_SYNCED_AT, synced_at.isoformat())
+        print(f"Synced the assignments of {len(stale)}/{len(hits)} HITs")
+        return synced_at
+
+    def __is_stale(self, hit, counts):
+        """
+        Helper function for Turker.sync_assignments: whether the cached assignments of the HIT
+        may differ from MTurk.
+
+        Args:
+            hit (dict): as returned by client.list_hits
+            counts (dict): number of cached assignments of the HIT per status
+        """
+        n_available = hit.get("NumberOfAssignmentsAvailable")
+        n_pending = hit.get("NumberOfAssignmentsPending")
+        n_completed = hit.get("NumberOfAssignmentsCompleted")
+        if None in [n_available, n_pending, n_completed]:
+            return True
+        # the assignments neither available, pending nor completed are awaiting review
+        n_submitted = hit["MaxAssignments"] - n_available - n_pending - n_completed
+        n_reviewed = counts.get("Approved", 0) + counts.get("Rejected", 0)
+        return counts.get("Submitted", 0) != n_submitted or n_reviewed != n_completed
+
+    def __sync_hit_assignments(self, hit):
+        """
+        Helper function for Turker.sync_assignments: request the assignments of the HIT
+        which may have changed and record them in the cache.
+        """
+        hit_id = hit["HITId"]
+        cached = self.store.get_assignments(hit_id)
+        cached_submitted = {
+            assignment["AssignmentId"]
+            for assignment in cached
+            if assignment["AssignmentStatus"] == "Submitted"
+        }
+        n_reviewed = len(cached) - len(cached_submitted)
+        submitted = list(
+            iter_assignments_for_hit(
+                self.client, hit_id, statuses=["Submitted"], page_size=self.page_size
+            )
+        )
+        reviewed = []
+        # cached assignments no longer submitted were approved/rejected since the last synchronization
+        no_longer_submitted = cached_submitted - {a["AssignmentId"] for a in submitted}
+        if hit.get("NumberOfAssignmentsCompleted") != n_reviewed or len(no_longer_submitted) > 0:
+            reviewed = list(
+                iter_assignments_for_hit(
+                    self.client,
+                    hit_id,
+                    statuses=["Approved", "Rejected"],
+                    page_size=self.page_size,
                 )
-                print(f"{self.p.url}")
-            df = []
-            for hit in hits:
-                row = {}
-                hitid = hit["HITId"]
-                row["FormIdx"] = self.hit2form.get(hitid, 9999)
-                row["HITId"] = hitid
-                row["Status"] = hit["HITStatus"]
-                comp = self.client.list_assignments_for_hit(
-                    HITId=hitid,
-                    AssignmentStatuses=["Submitted", "Approved", "Rejected"],
-                )["NumResults"]
-                row["Completed"] = comp
-                maxo = hit["MaxAssignments"]
-                row["Percent_completed"] = int(comp / maxo * 100)
-                df.append(row)
-            df = pd.DataFrame(df).set_index("FormIdx").sort_index()
-            return df
-
-    def create_forms_hits(
-        self,
-    ):
+            )
+        self.store.upsert_assignments(submitted + reviewed)
+
+    def create_forms_hits(self, max_workers=None):
         """
         Generate and publish the HITs corresponding to the forms whose index
         are present in Turker.gform_map
+
+        A single HIT type is created for the whole batch, the HITs are then published concurrently.
+        Each HIT is recorded in hit2form as soon as it is created: forms already having a HIT are skipped,
+        so that an interrupted run resumes where it stopped. Every form has a deterministic UniqueRequestToken,
+        which prevents MTurk from creating duplicates when a creation is retried.
+
+        Args:
+            max_workers (int): If value is set, overrides self.max_workers. Number of HITs published concurrently.
+        """
+        if max_workers is None:
+            max_workers = self.max_workers
+
+        published = set(self.hit2form.values())
+        forms = [
+            (idx, val["url"])
+            for idx, val in self.gform_map.items()
+            if idx not in published
+        ]
+        if len(published) > 0:
+            print(f"Skipping {len(self.gform_map) - len(forms)} forms already published")
+        if len(forms) == 0:
+            return
+
+        hit_type_id = self.create_hit_type()
+
+        failures = {}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(self.__create_form_hit, hit_type_id, idx, url): idx
+                for idx, url in forms
+            }
+            for future in as_completed(futures):
+                idx = futures[future]
+                try:
+                    future.result()
+                except ClientError as err:
+                    print(f"Failed to create hit for form {idx}: {err}")
+                    failures[idx] = err
+        if len(failures) > 0:
+            print(
+                f"{len(failures)} hits could not be created: call create_forms_hits again to resume"
+            )
+        print(f"Hits available on {self.p.url}")
+
+    def create_hit_type(self):
+        """
+        Create (or retrieve, MTurk returns the same id for identical parameters) the HIT type
+        shared by all the HITs of the Turker.
+
+        Returns:
+            [str]: MTurk HIT type id
         """
-        for idx, url in [(idx, val["url"]) for idx, val in self.gform_map.items()]:
-            print(f"Creating hit for form {idx}")
+        hit_type = self.client.create_hit_type(
+            AutoApprovalDelayInSeconds=self.p.AutoApprovalDelayInSeconds,
+            AssignmentDurationInSeconds=self.p.AssignmentDurationInSeconds,
+            Reward=self.p.Reward,
+            Title=self.p.HITTitle,
+            Keywords=self.p.Keywords,
+            Description=self.p.Description,
+            QualificationRequirements=self.p.QualificationRequirements,
+        )
+        return hit_type["HITTypeId"]
 
-            myhit = self.client.create_hit(
+    def __create_form_hit(self, hit_type_id, idx, url):
+        """
+        Helper function for Turker.create_forms_hits: publish the HIT of a single form
+        and record it in hit2form.
+
+        Returns:
+            [str]: MTurk HIT id
+        """
+        print(f"Creating hit for form {idx}")
+        token = hashlib.sha1(f"{hit_type_id}:{idx}:{url}".encode()).hexdigest()
+        try:
+            myhit = call_with_retry(
+                self.client.create_hit_with_hit_type,
+                HITTypeId=hit_type_id,
                 MaxAssignments=self.p.MaxAssignments,
                 LifetimeInSeconds=self.p.LifetimeInSeconds,
-                AutoApprovalDelayInSeconds=self.p.AutoApprovalDelayInSeconds,
-                AssignmentDurationInSeconds=self.p.AssignmentDurationInSeconds,
-                Reward=self.p.Reward,
                 HITLayoutId=self.p.hit_layout,
                 HITLayoutParameters=[{"Name": "url", "Value": url}],
-                Title=f"{self.p.HITTitle} {idx}",
-                Keywords=self.p.Keywords,
-                Description=self.p.Description,
-                QualificationRequirements=self.p.QualificationRequirements,
+                RequesterAnnotation=token,
+                UniqueRequestToken=token,
             )
-            self.hit2form[myhit["HIT"]["HITId"]] = idx
-        self.__update_hit2form()
-        print(f"Hits available on {self.p.url}")
+            hit_id = myhit["HIT"]["HITId"]
+        except ClientError as error:
+            # the HIT may have been created by a run interrupted before recording it
+            if not is_duplicate_token_error(error):
+                raise
+            hit_id = self.__find_hit_by_token(token)
+            if hit_id is None:
+                raise
+        self.store.add_hit(hit_id, idx, hit_type_id)
+        return hit_id
+
+    def __find_hit_by_token(self, token):
+        """
+        Helper function for Turker.create_forms_hits: search the HIT created with the given
+        UniqueRequestToken (stored as its RequesterAnnotation).
+
+        Returns:
+            [str]: MTurk HIT id, None if no such HIT exists
+        """
+        for hit in iter_hits(self.client, self.page_size):
+            if hit.get("RequesterAnnotation") == token:
+                return hit["HITId"]
+        return None
 
     def get_results(self, id):
         """
         Download and return the most recent version of the Google Forms results corresponding to id (HITid or Google form index)
         as a pd.Dataframe ()
+        The results are cached: for results_ttl seconds after a download, they are returned without checking Drive
+        for new responses, cf mt2gf.cache.ResultsCache
 
         Args:
             id (int or str): if int, must correspond to the index of the Google form. If string, must correspond to a valid HIT id
@@ -310,14 +829,39 @@ class Turker:
                     form_idx = int(id)
                 else:
                     form_idx = self.hit2form[id]
-            gid = self.gform_map[form_idx]["driveid"]
+            else:
+                form_idx = id
+            self.gform_map[form_idx]
         except KeyError:
             raise KeyError("Invalid form index/ hit id")
-        path = self.formresdir.joinpath(f"{form_idx}.csv")
-        download_csv(path, gid, self.gservice, verbose=True)
-        df = pd.read_csv(path)
+        df = self.results_cache.get(form_idx)
+        if df is None:
+            path = self.__download_form(form_idx)
+            df = self.results_cache.load(form_idx, path)
         return df
 
+    def __download_form(self, form_idx):
+        """
+        Ensure the local csv of the given form holds the most recent version of its results.
+
+        Args:
+            form_idx (int): index of the Google form
+
+        Returns:
+            [pathlib.Path]: path to the local csv
+        """
+        report = download_multi_csv(
+            {form_idx: self.gform_map[form_idx]},
+            self.formresdir,
+            self.gservice,
+            sync_mode=self.sync_mode,
+            incremental=self.incremental,
+        )
+        error = report.loc[form_idx, "error"]
+        if pd.notna(error):
+            raise ValueError(error)
+        return self.formresdir.joinpath(f"{form_idx}.csv")
+
     def list_assignments(self, hit_id):
         """
         Return all the assignments corresponding to the given hit_id
@@ -328,90 +872,130 @@ class Turker:
         Returns:
             [pd.DataFrame]: Columns WorkerId,HITId,FormId,ConfCode,AcceptTime,SubmitTime,TrueConfCode,Status
         """
-        worker_results = self.client.list_assignments_for_hit(
-            HITId=hit_id, AssignmentStatuses=["Submitted", "Approved", "Rejected"]
+        assignments = list(
+            iter_assignments_for_hit(self.client, hit_id, page_size=self.page_size)
         )
-        if worker_results["NumResults"] > 0:
-            df = []
-            for assignment in worker_results["Assignments"]:
-                answer = get_answer(assignment["Answer"])
-                if self.check_conf_code:
-                    conf_code = self.conf_code_generator(self.hit2form[hit_id])
-                else:
-                    conf_code = None
-                df.append(
-                    {
-                        "WorkerId": assignment["WorkerId"],
-                        "HITId": hit_id,
-                        "FormId": self.hit2form[hit_id],
-                        "ConfCode": answer,
-                        "AcceptTime": assignment["AcceptTime"],
-                        "SubmitTime": assignment["SubmitTime"],
-                        "TrueConfCode": conf_code,
-                        "Status": assignment["AssignmentStatus"],
-                    }
-                )
-            df = pd.DataFrame(df)
-            return df
-        else:
+        self.store.upsert_assignments(assignments)
+        if len(assignments) == 0:
             print(f"No results ready yet for {hit_id}")
             return None
+        return self.__tabulate_assignments(assignments)
 
     def list_all_assignments(self):
         """
-        List all assignments for all hits. Cf Turker.list_assignments
+        List all assignments for all hits, from the local cache. Cf Turker.list_assignments
+        and Turker.sync_assignments
 
         Returns:
             [pd.DataFrame]: Concatenation of the dataframe returned by list_assignments for all HITs.
         """
-        df = []
-        hits = self.client.list_hits()["HITs"]
-        if len(hits) == 0:
+        self.sync_assignments()
+        assignments = self.store.get_assignments()
+        if len(assignments) == 0:
             print("No results")
             return pd.DataFrame()
-        for hit in hits:
-            hit_id = hit["HITId"]
-            assignment = self.list_assignments(hit_id)
-            if assignment is not None:
-                df.append(assignment)
-        if len(df) == 0:
-            return pd.DataFrame()
-        df = pd.concat(df, axis=0)
-        return df
+        return self.__tabulate_assignments(assignments)
+
+    def __tabulate_assignments(self, assignments):
+        """
+        Helper function for Turker.list_assignments and Turker.list_all_assignments
+
+        Args:
+            assignments (list of dict): as returned by client.list_assignments_for_hit
+
+        Returns:
+            [pd.DataFrame]: cf Turker.list_assignments
+        """
+        answers = self.__get_conf_codes(assignments)
+        df = []
+        for assignment in assignments:
+            hit_id = assignment["HITId"]
+            answer = answers[assignment["AssignmentId"]]
+            if self.check_conf_code:
+                conf_code = self.conf_code_generator(self.hit2form[hit_id])
+            else:
+                conf_code = None
+            df.append(
+                {
+                    "WorkerId": assignment["WorkerId"],
+                    "HITId": hit_id,
+                    "FormId": self.hit2form[hit_id],
+                    "ConfCode": answer,
+                    "AcceptTime": assignment["AcceptTime"],
+                    "SubmitTime": assignment["SubmitTime"],
+                    "TrueConfCode": conf_code,
+                    "Status": assignment["AssignmentStatus"],
+                }
+            )
+        return pd.DataFrame(df)
 
     def save_worker_infos(self, directory=None):
         """
-        Save the workers metadata (completion time etc)
+        Save the workers metadata (completion time etc). Only the assignments not yet saved are
+        appended to the workers_info.csv file, cf mt2gf.store.StateStore.add_worker_infos
 
         Args:
             directory (str): directory in which the worker infos will be saved. Defaults
             to the formresdir directory.
         """
         # Default directory
-        directory = Path(directory)
         if directory is None:
             directory = self.formresdir
-        df = self.list_all_assignments()
+        directory = Path(directory)
+        workers_infos_path = directory.joinpath("workers_info.csv").resolve()
 
-        # If no assignments are ready yet
-        if df.shape[0] == 0:
-            return None
+        self.sync_assignments()
+        self.__migrate_worker_infos(workers_infos_path)
+        assignments = self.store.get_unsaved_assignments(workers_infos_path)
 
-        # We have at least one assignment
-        df = df[["WorkerId", "FormId", "AcceptTime", "SubmitTime"]]
-        df["AnswerDurationInSeconds"] = (df["SubmitTime"] - df["AcceptTime"]).dt.seconds
-        df.drop(columns=["AcceptTime", "SubmitTime"], inplace=True)
+        # If no new assignments are ready yet
+        if len(assignments) == 0:
+            return None
 
-        workers_infos_path = directory.joinpath("workers_info.csv")
+        rows = {
+            (
+                assignment["WorkerId"],
+                assignment["FormIdx"],
+                assignment["AssignmentId"],
+            ): {
+                "WorkerId": assignment["WorkerId"],
+                "FormId": assignment["FormIdx"],
+                "AnswerDurationInSeconds": (
+                    assignment["SubmitTime"] - assignment["AcceptTime"]
+                ).seconds,
+            }
+            for assignment in assignments
+        }
+
+        def append(keys):
+            df = pd.DataFrame([rows[key] for key in keys])
+            # the header is only written when the file is created
+            df.to_csv(
+                workers_infos_path,
+                mode="a",
+                header=not workers_infos_path.exists(),
+                index=False,
+            )
 
-        # append mode if some information was already here
-        if workers_infos_path.exists():
-            old_df = pd.read_csv(workers_infos_path)
-            df = pd.concat([old_df, df], axis=0)
-            # we get rid of potential duplicates
-            df.drop_duplicates(inplace=True)
+        self.store.add_worker_infos(workers_infos_path, list(rows), append)
 
-        df.to_csv(workers_infos_path, index=False)
+    def __migrate_worker_infos(self, workers_infos_path):
+        """
+        Helper function for Turker.save_worker_infos: record once the rows of a workers_info.csv
+        file written by former versions of the Turker, so that they are not appended again.
+        """
+        key = f"migrated:{workers_infos_path}"
+        if not workers_infos_path.exists() or self.store.get_meta(key) is not None:
+            return
+        old_df = pd.read_csv(workers_infos_path)
+        saved = set(zip(old_df["WorkerId"], old_df["FormId"]))
+        keys = [
+            (assignment["WorkerId"], assignment["FormIdx"], assignment["AssignmentId"])
+            for assignment in self.store.get_unsaved_assignments(workers_infos_path)
+            if (assignment["WorkerId"], assignment["FormIdx"]) in saved
+        ]
+        self.store.add_worker_infos(workers_infos_path, keys)
+        self.store.set_meta(key, datetime.now().isoformat())
 
     def approve_correct_assignments(
         self, hit_id, callbacks=None, check_code_frauders=None, dry_run=False
@@ -430,8 +1014,49 @@ class Turker:
             in an MTurk HIt but absent of the Google form. This makes sure that no HIT will be validated without data in the Google Form.
             NB: Worker entering a malformed ID are rejected as well
             dry_run (Bool): if set to True, no HIT will be effectively validated or rejected: the output
+
+        Returns:
+            [pd.DataFrame]: outcome of every assignment review, cf mt2gf.mturk.execute_review_decisions
         """
+        decisions = self.__get_review_decisions(hit_id, callbacks, check_code_frauders)
+        return self.__execute_decisions(decisions, dry_run=dry_run)
 
+    def __get_review_decisions(self, hit_id, callbacks=None, check_code_frauders=None):
+        """
+        Helper function for Turker.approve_correct_assignments: decide which assignments
+        of the HIT must be approved or rejected.
+
+        Args:
+            cf approve_correct_assignments
+
+        Returns:
+            [list of dict]: decisions, as expected by mt2gf.mturk.execute_review_decisions
+        """
+        callbacks, check_code_frauders = self.__get_review_conditions(
+            callbacks, check_code_frauders
+        )
+        # Convert the hit id to a form index
+        form_idx = self.hit2form[hit_id]
+        assignments_df = self.__get_assignments_df(
+            hit_id, self.__list_submitted_assignments(hit_id)
+        )
+        # Ensure we have the latest version for this given file
+        forms_df = self.__get_forms_df(
+            form_idx, self.results_cache.load(form_idx, self.__download_form(form_idx))
+        )
+        return self.__decide(forms_df, assignments_df, callbacks, check_code_frauders)
+
+    def __get_review_conditions(self, callbacks, check_code_frauders):
+        """
+        Helper function for Turker.approve_correct_assignments: resolve the review conditions.
+
+        Args:
+            cf approve_correct_assignments
+
+        Returns:
+            (list of func): callbacks to apply
+            (bool): whether to check for code frauders
+        """
         # Function argument override class attributes
         if callbacks is None:
             callbacks = self.frauder_callbacks
@@ -448,144 +1073,272 @@ class Turker:
             raise ValueError(
                 "No condition was defined to determine correct assignments: set the callbacks value to approve_correct_assignments or one of check_conf_code or check_code_frauders"
             )
+        return callbacks, check_code_frauders
 
-        # Convert the hit id to a form index
-        form_idx = self.hit2form[hit_id]
-
-        assignments = self.client.list_assignments_for_hit(
-            HITId=hit_id, AssignmentStatuses=["Submitted"]
-        )["Assignments"]
-
-        frauders_data = self.__build_frauders_data(
-            form_idx, assignments, callbacks, check_code_frauders
+    def __list_submitted_assignments(self, hit_id):
+        """
+        Helper function for the review: list the assignments awaiting review.
+        """
+        # approving an assignment removes it from the Submitted listing: collect them first
+        assignments = list(
+            iter_assignments_for_hit(
+                self.client, hit_id, statuses=["Submitted"], page_size=self.page_size
+            )
         )
+        self.store.upsert_assignments(assignments)
+        return assignments
 
-        # We iterate over the assignments and check for frauders
-        for assignment in assignments:
-            ass_id = assignment["AssignmentId"]
-            worker_id = assignment["WorkerId"]
-            reject, requester_feedback = self.__detect_fraudulous_worker(
-                worker_id, frauders_data
-            )
-            if reject:
-                print(f"Reject wid {worker_id} hitid {hit_id} formidx {form_idx}")
-                print(requester_feedback)
-                if not dry_run:
-                    self.client.reject_assignment(
-                        AssignmentId=ass_id, RequesterFeedback=requester_feedback
-                    )
-            else:
-                print(f"Approve wid {worker_id} hitid {hit_id} formidx {form_idx}")
-                if not dry_run:
-                    self.client.approve_assignment(AssignmentId=ass_id)
+    def __get_assignments_df(self, hit_id, assignments):
+        """
+        Helper function for the review: tabulate the assignments of the HIT.
 
-    def __detect_fraudulous_worker(self, worker_id, frauders_data):
+        Returns:
+            [pd.DataFrame]: columns AssignmentId, WorkerId, HITId, FormIdx and ConfCode
         """
-        Helper function for Turker.approve_correct_assignments.
+        columns = ["AssignmentId", "WorkerId", "HITId", "FormIdx", "ConfCode"]
+        conf_codes = self.__get_conf_codes(assignments)
+        rows = [
+            {
+                "AssignmentId": assignment["AssignmentId"],
+                "WorkerId": assignment["WorkerId"],
+                "HITId": hit_id,
+                "FormIdx": self.hit2form[hit_id],
+                "ConfCode": conf_codes[assignment["AssignmentId"]],
+            }
+            for assignment in assignments
+        ]
+        return pd.DataFrame(rows, columns=columns)
 
-        Args:
-            cf approve_correct_assignments
+    def __get_conf_codes(self, assignments):
+        """
+        Helper function: confirmation code entered in each assignment (answer to the first question),
+        cf mt2gf.mturk.parse_answers
 
         Returns:
-            (bool): whether the worker needs to be rejected
-            (str): corresponding feedback citingthe reason(s) for the rejection
-        """
-        requester_feedback = ""
-        reject = False
-        for frauder_data in frauders_data:
-            frauders = frauder_data["frauders"]
-            msg = frauder_data["feedback"]
-            if worker_id in frauders:
-                requester_feedback += msg + "\n"
-                reject = True
-        return reject, requester_feedback
-
-    def __build_frauders_data(
-        self, form_idx, assignments, callbacks, check_code_frauders
-    ):
+            [dict]: mapping each AssignmentId to its confirmation code
         """
-        Helper function for Turker.approve_correct_assignments.
+        answers = parse_answers(assignments, self.answers_cache)
+        answers = answers.drop_duplicates(subset="AssignmentId", keep="first")
+        return dict(zip(answers["AssignmentId"], answers["Answer"]))
 
-        Args:
-            cf approve_correct_assignments
+    def __get_forms_df(self, form_idx, form_df):
+        """
+        Helper function for the review: add the FormIdx column to the results of the form.
+        """
+        form_df = form_df.copy()
+        form_df["FormIdx"] = form_idx
+        return form_df
 
-        Returns:
-            [list of dict]: each dict has an 'frauders' entry (set of string corresponding to WorkerID to reject for the HIT)
-            and 'feedback' entry (Why the given worker needs to be rejected)
+    def __decide(self, forms_df, assignments_df, callbacks, check_code_frauders):
         """
-        # Path where to store the results
-        form_path = self.formresdir.joinpath(f"{form_idx}.csv")
-        drive_id = self.gform_map[form_idx]["driveid"]
+        Helper function for the review: evaluate the rejection rules (cf mt2gf.fraudulous.evaluate_rules)
+        and turn the decision table into decisions.
 
-        # Ensure we have the latest version for this given file
-        download_csv(form_path, drive_id, self.gservice)
-        form_df = pd.read_csv(form_path)
+        Args:
+            forms_df (pd.DataFrame): concatenation of the forms results, with a FormIdx column
+            assignments_df (pd.DataFrame): as returned by Turker.__get_assignments_df
+            callbacks, check_code_frauders: cf approve_correct_assignments
 
-        # Real MTurk worker ids
-        workers = set([assignment["WorkerId"] for assignment in assignments])
+        Returns:
+            [list of dict]: decisions, as expected by mt2gf.mturk.execute_review_decisions
+        """
+        table = evaluate_rules(
+            forms_df,
+            assignments_df,
+            self.__get_rules(assignments_df, callbacks, check_code_frauders),
+        )
+        table = table.rename(columns={"reject": "Reject", "reasons": "Feedback"})
+        return table.to_dict(orient="records")
 
-        frauders_data = []
+    def __get_rules(self, assignments_df, callbacks, check_code_frauders):
+        """
+        Helper function for the review: rules to evaluate, cf mt2gf.fraudulous.evaluate_rules
+        """
+        rules = []
         # Check for valid confirmation code
         if self.check_conf_code:
-            frauders = self.__detect_conf_code_frauders(
-                assignments=assignments, conf_code=self.conf_code_generator(form_idx)
-            )
-            conf_code_frauders = {
-                "frauders": frauders,
-                "feedback": "Invalid confirmation code.",
+            conf_codes = {
+                form_idx: self.conf_code_generator(form_idx)
+                for form_idx in assignments_df["FormIdx"].unique()
             }
-            frauders_data.append(conf_code_frauders)
+            rules.append((conf_code_rule(conf_codes), CONF_CODE_FEEDBACK))
 
         # Check for workers who entered a confirmation code but are not present in the gform data
         if check_code_frauders:
-            workers_mturk = workers
-            worker_gform = set(form_df["WorkerID"].unique())
-            # Those workers who Gave an MTurk completion code but are not present in the Gform data
-            # Prevent workers from sharing the completion code
-            frauders = workers_mturk - worker_gform
-            fake_id_frauders = {
-                "frauders": frauders,
-                "feedback": "Your Worker Id was not present in the form/Incorrectly spelled.",
-            }
-            frauders_data.append(fake_id_frauders)
+            rules.append((missing_from_form_rule, MISSING_FROM_FORM_FEEDBACK))
 
         # User-defined callbacks
         for callback_func, callback_feedback in callbacks:
-            frauders = callback_func(form_df)
-            frauders_data.append({"frauders": frauders, "feedback": callback_feedback})
-        return frauders_data
+            rules.append((per_form_callback(callback_func), callback_feedback))
+        return rules
 
-    def __detect_conf_code_frauders(self, assignments, true_conf_code):
+    def build_decision_table(self, callbacks=None, check_code_frauders=None):
         """
-        Helper function for Turker.approve_correct_assignments: detects the confirmation
-        code frauders
+        Evaluate the rejection rules once over all the submitted assignments of the reviewable HITs
+        and the results of their forms, without approving or rejecting anything.
 
         Args:
-            assignments: as returned by self.client.list_assignments_for_hit
-            true_conf_code (str): true confirmation code
+            callbacks, check_code_frauders: cf approve_correct_assignments
 
         Returns:
-            [type]: [description]
+            [pd.DataFrame]: decision table, cf mt2gf.fraudulous.evaluate_rules
         """
-        conf_code_frauders = set()
-        for assignment in assignments:
-            worker_id = assignment["WorkerId"]
-            answer = get_answer(assignment["Answer"])
-            if answer != true_conf_code:
-                conf_code_frauders.add(worker_id)
-        return conf_code_frauders
+        callbacks, check_code_frauders = self.__get_review_conditions(
+            callbacks, check_code_frauders
+        )
+        hit_ids = [hit["HITId"] for hit in self.list_reviewable_hits()]
+
+        def list_assignments(hit_id):
+            return self.__get_assignments_df(
+                hit_id, self.__list_submitted_assignments(hit_id)
+            )
 
-    def approve_correct_hits(self, dry_run=False):
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            assignments_dfs = list(executor.map(list_assignments, hit_ids))
+        if len(assignments_dfs) == 0:
+            return evaluate_rules(
+                pd.DataFrame(columns=["FormIdx", "WorkerID"]),
+                self.__get_assignments_df(None, []),
+                [],
+            )
+        assignments_df = pd.concat(assignments_dfs, axis=0, ignore_index=True)
+
+        # Ensure we have the latest version of the forms
+        form_idxes = assignments_df["FormIdx"].unique().tolist()
+        report = download_multi_csv(
+            {form_idx: self.gform_map[form_idx] for form_idx in form_idxes},
+            self.formresdir,
+            self.gservice,
+            max_workers=self.max_workers,
+            sync_mode=self.sync_mode,
+            incremental=self.incremental,
+        )
+        failed = report[report["error"].notna()]
+        if len(failed) > 0:
+            raise ValueError(f"Could not download forms {failed.index.tolist()}")
+        forms_df = pd.concat(
+            [
+                self.__get_forms_df(
+                    form_idx,
+                    self.results_cache.load(
+                        form_idx, self.formresdir.joinpath(f"{form_idx}.csv")
+                    ),
+                )
+                for form_idx in form_idxes
+            ],
+            axis=0,
+            ignore_index=True,
+        )
+        return evaluate_rules(
+            forms_df,
+            assignments_df,
+            self.__get_rules(assignments_df, callbacks, check_code_frauders),
+        )
+
+    def approve_correct_hits(self, dry_run=False, stage_workers=None, queue_size=8):
         """
         Approve all the HITs that don't violate any of the callback functions, reject the others.
 
+        The reviewable HITs stream through a pipeline whose stages (listing of the submitted assignments,
+        form download, parsing, fraud evaluation, MTurk decisions) run concurrently, each with its own
+        threads and bounded input queue: network and CPU work overlap while memory remains bounded.
+
         Args:
             dry_run (Bool): if set to True, no HIT will be effectively validated or rejected: the output
             remains the same for pre-checking the effect of a wet run.
+            stage_workers (dict): number of threads of the "listing", "download", "parsing", "evaluation"
+            and "decisions" stages. Missing stages default to self.max_workers for the network-bound
+            stages and 1 for the CPU-bound ones.
+            queue_size (int): maximal number of HITs waiting in front of each stage
+
+        Returns:
+            [pd.DataFrame]: outcome of every assignment review, cf mt2gf.mturk.execute_review_decisions.
+            A HIT whose review raised an error gets a single "Failed" row with its HITId, FormIdx
+            and the error: the other HITs are reviewed regardless and the table is still returned.
         """
-        hits = self.list_reviewable_hits()
-        for hit in hits:
-            self.approve_correct_assignments(hit["HITId"], dry_run=dry_run)
+        callbacks, check_code_frauders = self.__get_review_conditions(None, None)
+        workers = {
+            "listing": self.max_workers,
+            "download": self.max_workers,
+            "parsing": 1,
+            "evaluation": 1,
+            "decisions": self.max_workers,
+        }
+        if stage_workers is not None:
+            workers.update(stage_workers)
+
+        def list_assignments(hit):
+            hit_id = hit["HITId"]
+            item = {"hit_id": hit_id, "form_idx": self.hit2form[hit_id]}
+            assignments = self.__list_submitted_assignments(hit_id)
+            item["assignments_df"] = self.__get_assignments_df(hit_id, assignments)
+            return item if len(assignments) > 0 else None
+
+        def download(item):
+            item["form_path"] = self.__download_form(item["form_idx"])
+            return item
+
+        def parse(item):
+            form_df = self.results_cache.load(item["form_idx"], item.pop("form_path"))
+            item["forms_df"] = self.__get_forms_df(item["form_idx"], form_df)
+            return item
+
+        def evaluate(item):
+            item["decisions"] = self.__decide(
+                item.pop("forms_df"),
+                item.pop("assignments_df"),
+                callbacks,
+                check_code_frauders,
+            )
+            return item
+
+        def decide(item):
+            return self.__execute_decisions(
+                item["decisions"], dry_run=dry_run, max_workers=1
+            )
+
+        hits = iter_reviewable_hits(self.client, self.page_size)
+        stages = [
+            (list_assignments, workers["listing"]),
+            (download, workers["download"]),
+            (parse, workers["parsing"]),
+            (evaluate, workers["evaluation"]),
+            (decide, workers["decisions"]),
+        ]
+        outcomes = run_pipeline(
+            hits, stages, queue_size=queue_size, on_error=self.__report_review_failure
+        )
+        if len(outcomes) == 0:
+            print("No reviewable hit available")
+            return execute_review_decisions(self.client, [])
+        return pd.concat(outcomes, axis=0, ignore_index=True)
+
+    def __report_review_failure(self, item, error):
+        """
+        Helper function for Turker.approve_correct_hits: outcome of a HIT whose review raised an error
+
+        Args:
+            item (dict): the listed HIT before the first stage, then the item passed between the stages.
+            None if the listing of the HITs itself failed.
+            error (Exception): error raised by the stage
+
+        Returns:
+            [pd.DataFrame]: single "Failed" row, cf mt2gf.mturk.execute_review_decisions
+        """
+        if item is None:
+            hit_id, form_idx = None, None
+        elif "HITId" in item:
+            hit_id, form_idx = item["HITId"], self.hit2form.get(item["HITId"])
+        else:
+            hit_id, form_idx = item["hit_id"], item["form_idx"]
+        print(f"Failed to review hit {hit_id}: {error}")
+        failure = {
+            "HITId": hit_id,
+            "FormIdx": form_idx,
+            "Outcome": "Failed",
+            "Error": str(error),
+        }
+        return pd.DataFrame([failure], columns=REVIEW_OUTCOME_COLUMNS)
 
     def approve_all_assignments(self, hit_id):
         """
@@ -594,35 +1347,84 @@ class Turker:
         If you wish to perform quality_check, cf approve_correct_assignments
 
         Args:
-            correct_hits (Bool): whether to correct correct hits exclusively
+            hit_id (str): MTurk HIT id
+
+        Returns:
+            [pd.DataFrame]: outcome of every assignment review, cf mt2gf.mturk.execute_review_decisions
+        """
+        decisions = self.__get_approve_all_decisions(hit_id)
+        return self.__execute_decisions(decisions)
+
+    def __execute_decisions(self, decisions, dry_run=False, max_workers=None):
         """
-        assignments = self.client.list_assignments_for_hit(
-            HITId=hit_id, AssignmentStatuses=["Submitted"]
+        Helper function for the review: execute the decisions and record the new status
+        of the reviewed assignments in the store.
+
+        Args:
+            decisions (list of dict): cf mt2gf.mturk.execute_review_decisions
+            dry_run (Bool): cf mt2gf.mturk.execute_review_decisions
+            max_workers (int): If value is set, overrides self.max_workers
+
+        Returns:
+            [pd.DataFrame]: cf mt2gf.mturk.execute_review_decisions
+        """
+        if max_workers is None:
+            max_workers = self.max_workers
+        outcomes = execute_review_decisions(
+            self.client, decisions, max_workers=max_workers, dry_run=dry_run
         )
-        assignments = assignments["Assignments"]
-        for assignment in assignments:
-            ass_id = assignment["AssignmentId"]
-            # TODO: assignment['AcceptTime'/'SubmitTime']
-            print(f"Approving assignment {ass_id}")
-            self.client.approve_assignment(AssignmentId=ass_id)
+        if not dry_run:
+            reviewed = outcomes[outcomes["Outcome"] != "Failed"]
+            self.store.set_assignments_status(
+                dict(zip(reviewed["AssignmentId"], reviewed["Outcome"]))
+            )
+        return outcomes
+
+    def __get_approve_all_decisions(self, hit_id):
+        """
+        Helper function for Turker.approve_all_assignments: approval decisions for all the
+        submitted assignments of the HIT.
+
+        Returns:
+            [list of dict]: decisions, as expected by mt2gf.mturk.execute_review_decisions
+        """
+        assignments = self.__list_submitted_assignments(hit_id)
+        # TODO: assignment['AcceptTime'/'SubmitTime']
+        return [
+            {
+                "AssignmentId": assignment["AssignmentId"],
+                "WorkerId": assignment["WorkerId"],
+                "HITId": hit_id,
+                "FormIdx": self.hit2form.get(hit_id),
+                "Reject": False,
+                "Feedback": "",
+            }
+            for assignment in assignments
+        ]
 
     def approve_all_hits(self):
         """
         Approve all assignments of all HITs regardless of their validity (No quality
         check or callbacks performed)
         If you wish to perform quality_check, cf approve_correct_assignments
+
+        Returns:
+            [pd.DataFrame]: outcome of every assignment review, cf mt2gf.mturk.execute_review_decisions
         """
         hits = self.list_reviewable_hits()
+        decisions = []
         for hit in hits:
-            self.approve_all_assignments(hit["HITId"])
+            decisions += self.__get_approve_all_decisions(hit["HITId"])
+        return self.__execute_decisions(decisions)
 
     def delete_all_hits(self):
         """
         Deletes all HITs having been been reviewed
         """
-        hits = self.client.list_hits()["HITs"]
-        for hit in hits:
-            self.delete_hit(hit["HITId"])
+        # the ids are collected first: deleting HITs while paginating would shift the pages
+        hit_ids = [hit["HITId"] for hit in iter_hits(self.client, self.page_size)]
+        for hit_id in hit_ids:
+            self.delete_hit(hit_id)
 
     def delete_hit(self, hit_id):
         """
@@ -637,16 +1439,9 @@ class Turker:
             print(f"Deleting hit {hit_id}")
             if hit_id in self.hit2form:
                 del self.hit2form[hit_id]
-                self.__update_hit2form()
         except:
             print(f"Can't delete {hit_id}. Is it reviewed?")
 
-    def __update_hit2form(self):
-        """
-        Update the mapping between HIT ids and Google forms indexes
-        """
-        pk.dump(self.hit2form, open(self.hit2form_path, "wb"))
-
     def stop_hit(self, hit_id):
         """
         Update the expiration date of the hit at a past date.
@@ -667,8 +1462,9 @@ class Turker:
         """
         Call Turker.stop_hit for every hit.
         """
-        hits = self.client.list_hits()["HITs"]
-        if len(hits) == 0:
-            print("No HITs to stop")
-        for hit in hits:
+        n_hits = 0
+        for hit in iter_hits(self.client, self.page_size):
             self.stop_hit(hit["HITId"])
+            n_hits += 1
+        if n_hits == 0:
+            print("No HITs to stop")
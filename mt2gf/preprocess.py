@@ -1,12 +1,35 @@
 """
-Preprocessing functions before mturk data gathering
+Preprocessing functions before mturk data gathering, and consolidation of the batches results
 """
+import os
+import re
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
 import pandas as pd
 import resource
 from copy import copy
 from mt2gf.gform import download_drive_txt
+from mt2gf.utils import count_csv_rows, load_json, save_json
 from pathlib import Path
 
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# manifest of the batches, cf load_batch_manifest
+BATCH_MANIFEST_FILENAME = ".batch_manifest.json"
+# bookkeeping files of the results dataset, ignored by the pyarrow datasets discovery
+DATASET_MANIFEST_FILENAME = "_manifest.json"
+DATASET_SCHEMA_FILENAME = "_common_metadata"
+# hive partitioning of the results dataset: <dataset_dir>/batch=<batch>/form=<form>/
+DATASET_PARTITIONING = ["batch", "form"]
+# time zone suffix of the Google Forms timestamps, e.g. "2020/11/30 10:00:00 AM GMT+1"
+GMT_OFFSET = re.compile(r"\s*GMT(?:([+-])(\d{1,2})(?::?(\d{2}))?)?\s*$")
+
 
 def create_batch_directories(directory, n_dirs):
     """
@@ -36,7 +59,8 @@ def batchnumber2formidxes(batch_number, batch_size):
 def check_previous_batches(recent_batch_number, parent_dir, MaxAssignments, batch_size):
     """
     Check the number of files and their size in all previous batches up to
-    current batch
+    current batch. The batches found complete are sealed in the batch manifest
+    and never checked again, cf load_batch_manifest
 
     Args:
         recent_bach_number (int): most recent batch (not included)
@@ -44,16 +68,20 @@ def check_previous_batches(recent_batch_number, parent_dir, MaxAssignments, batc
         MaxAssignments (int): total number of worker answer expected per form
         batch_size (int): number of forms to get ansewred per batch
     """
+    manifest = load_batch_manifest(parent_dir, batch_size, MaxAssignments)
     # we check up to the most recent batch
-    for batch_number in range(recent_batch_number):
+    for batch_number in range(manifest["sealed"] + 1, recent_batch_number):
         batch_path = parent_dir.joinpath(str(batch_number))
-        valid, msg = check_is_complete(batch_path, MaxAssignments, batch_size)
+        valid, msg = check_is_complete(batch_path, MaxAssignments, batch_size, manifest)
         if not valid:
+            save_batch_manifest(parent_dir, manifest)
             raise ValueError(msg)
+        seal_batch(manifest, batch_number)
+    save_batch_manifest(parent_dir, manifest)
     print(f"All batches clean up to batch {recent_batch_number}")
 
 
-def check_is_complete(batch_path, MaxAssignments, batch_size):
+def check_is_complete(batch_path, MaxAssignments, batch_size, manifest=None):
     """
     check that the batch present at batch_path follows some structure:
     i.e. has batch_size files and each file has at least MaxAssignments rows.
@@ -62,6 +90,7 @@ def check_is_complete(batch_path, MaxAssignments, batch_size):
         batch_path (str): path where to store the results of the batch
         MaxAssignments (int): total number of worker answer expected per form
         batch_size (int): number of forms to get ansewred per batch
+        manifest (dict): batch manifest caching the number of rows of the files, cf load_batch_manifest
     """
     batch_path = Path(batch_path)
     # form indexes we expect in this batch
@@ -85,9 +114,12 @@ def check_is_complete(batch_path, MaxAssignments, batch_size):
             raise ValueError(
                 f"Form index {form_idx} should not be present in batch {batch_number}"
             )
-        df = pd.read_csv(form_path)
+        if manifest is None:
+            n_rows = count_csv_rows(form_path)
+        else:
+            n_rows = count_form_rows(form_path, manifest)
         # check the files have the correct number of row
-        if df.shape[0] < MaxAssignments:
+        if n_rows < MaxAssignments:
             return (
                 False,
                 f"Form {form_idx} in batch {batch_number} is missing some entries.",
@@ -97,7 +129,8 @@ def check_is_complete(batch_path, MaxAssignments, batch_size):
 
 def get_batch_indexes(parent_dir, batch_number=None, batch_size=7, MaxAssignments=30):
     """
-    Function to get the next batch information
+    Function to get the next batch information. The batches being run in order, only the
+    batches following the last sealed one are checked, cf load_batch_manifest
 
     Args:
         batch_size(int): number of forms per batch
@@ -109,24 +142,385 @@ def get_batch_indexes(parent_dir, batch_number=None, batch_size=7, MaxAssignment
         [list of int]: indexes of the forms to run the analysis for
     """
     if batch_number is None:
-        batch_paths = [path.parent for path in parent_dir.glob("**/[0-9]*.csv")]
-        if len(batch_paths) == 0:
-            batch_number = 0
-        else:
-            recent_batch_dir = max(batch_paths, key=lambda x: x.stem)
-            recent_batch_number = int(recent_batch_dir.stem)
-            check_previous_batches(
-                recent_batch_number, parent_dir, MaxAssignments, batch_size
-            )
-
-            complete, _ = check_is_complete(
-                recent_batch_dir, MaxAssignments, batch_size
+        manifest = load_batch_manifest(parent_dir, batch_size, MaxAssignments)
+        batch_number = manifest["sealed"] + 1
+        while has_results(parent_dir, batch_number):
+            complete, msg = check_is_complete(
+                parent_dir.joinpath(str(batch_number)), MaxAssignments, batch_size, manifest
             )
-            if complete:
-                batch_number = recent_batch_number + 1
-            else:
+            if not complete:
+                # an incomplete batch can only be resumed if no later batch was started
+                if has_results(parent_dir, batch_number + 1):
+                    save_batch_manifest(parent_dir, manifest)
+                    raise ValueError(msg)
                 print("Resuming previous incomplete batch")
-                batch_number = recent_batch_number
+                break
+            seal_batch(manifest, batch_number)
+            batch_number += 1
+        save_batch_manifest(parent_dir, manifest)
+        # a gap in the batches: the next batch would be run next to an existing later one
+        later_batches = get_later_batches(parent_dir, batch_number)
+        if len(later_batches) > 0:
+            raise ValueError(
+                f"Batches {later_batches} were started before batch {batch_number} was complete"
+            )
     form_idxes = batchnumber2formidxes(batch_number, batch_size)
     batch_dir = parent_dir.joinpath(str(batch_number))
     return batch_dir, batch_number, form_idxes
+
+
+def has_results(parent_dir, batch_number):
+    """
+    Return whether the directory of the batch contains forms results
+    """
+    return any(parent_dir.joinpath(str(batch_number)).glob("[0-9]*.csv"))
+
+
+def get_later_batches(parent_dir, batch_number):
+    """
+    Return the numbers of the batches following batch_number whose directory contains forms results
+    """
+    return sorted(
+        int(batch_dir.name)
+        for batch_dir in parent_dir.glob("[0-9]*")
+        if batch_dir.name.isdigit()
+        and int(batch_dir.name) > batch_number
+        and has_results(parent_dir, int(batch_dir.name))
+    )
+
+
+def load_batch_manifest(parent_dir, batch_size, MaxAssignments):
+    """
+    Load the batch manifest of parent_dir. It holds the index of the last sealed batch (all the batches up
+    to it are complete and never checked again), and the number of rows of the files of the unsealed batches
+    along with the size and modification time they were counted at.
+    The sealing depending on batch_size and MaxAssignments, it is reset when they change.
+
+    Args:
+        parent_dir (pathlib.Path): parent directory containing the batches
+        batch_size (int): number of forms per batch
+        MaxAssignments (int): total number of worker answer expected per form
+
+    Return
+        [dict]: manifest with params, sealed and files entries
+    """
+    manifest = load_manifest(Path(parent_dir).joinpath(BATCH_MANIFEST_FILENAME))
+    params = {"batch_size": batch_size, "MaxAssignments": MaxAssignments}
+    if manifest.get("params") != params:
+        manifest = {"params": params, "sealed": -1, "files": manifest.get("files", {})}
+    return manifest
+
+
+def save_batch_manifest(parent_dir, manifest):
+    """
+    Save the batch manifest of parent_dir. Cf load_batch_manifest
+    """
+    save_manifest(Path(parent_dir).joinpath(BATCH_MANIFEST_FILENAME), manifest)
+
+
+def seal_batch(manifest, batch_number):
+    """
+    Mark the batch as complete in the manifest: its files are no longer tracked
+    """
+    manifest["sealed"] = batch_number
+    prefix = f"{batch_number}/"
+    manifest["files"] = {
+        key: entry for key, entry in manifest["files"].items() if not key.startswith(prefix)
+    }
+
+
+def count_form_rows(form_path, manifest):
+    """
+    Return the number of rows of the form results at form_path, counted again only if the file
+    size or modification time changed since recorded in the manifest
+
+    Args:
+        form_path (pathlib.Path): path to the form csv, in its batch directory
+        manifest (dict): cf load_batch_manifest
+
+    Return
+        [int]: number of rows, header excluded
+    """
+    key = f"{form_path.parent.name}/{form_path.name}"
+    stat = form_path.stat()
+    entry = manifest["files"].get(key)
+    if entry is None or [entry["size"], entry["mtime_ns"]] != [stat.st_size, stat.st_mtime_ns]:
+        entry = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "rows": count_csv_rows(form_path),
+        }
+        manifest["files"][key] = entry
+    return entry["rows"]
+
+
+def validate_batches(parent_dir, MaxAssignments, batch_size, batch_numbers=None, max_workers=None):
+    """
+    Check the batches across a pool of processes and report all their issues at once, instead of
+    stopping at the first one as check_previous_batches does. Cf validate_batch for the issues reported.
+
+    Args:
+        parent_dir (pathlib.Path): parent directory containing the batches
+        MaxAssignments (int): total number of worker answer expected per form
+        batch_size (int): number of forms per batch
+        batch_numbers (list of int): batches to check. Defaults to all the batch directories containing results
+        max_workers (int): number of processes, defaults to the number of processors. Set to 1 to check
+        the batches sequentially in the current process.
+
+    Return
+        [pd.DataFrame]: one row per issue with columns batch, form, issue and detail. Empty if all the batches are complete
+    """
+    parent_dir = Path(parent_dir)
+    if batch_numbers is None:
+        batch_numbers = sorted(
+            int(path.name)
+            for path in parent_dir.iterdir()
+            if path.is_dir() and path.name.isdigit() and has_results(parent_dir, path.name)
+        )
+    batch_paths = [parent_dir.joinpath(str(batch_number)) for batch_number in batch_numbers]
+    args = ([MaxAssignments] * len(batch_paths), [batch_size] * len(batch_paths))
+    if max_workers == 1:
+        reports = list(map(validate_batch, batch_paths, *args))
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            reports = list(executor.map(validate_batch, batch_paths, *args))
+    issues = [issue for report in reports for issue in report]
+    print(f"{len(issues)} issues found in {len(batch_paths)} batches")
+    return pd.DataFrame(issues, columns=["batch", "form", "issue", "detail"])
+
+
+def validate_batch(batch_path, MaxAssignments, batch_size):
+    """
+    Helper function for validate_batches: list all the issues of the batch present at batch_path, that is
+    missing forms ("missing"), forms which belong to another batch ("misplaced"), forms which can't be
+    read or lack the WorkerID column ("malformed") and forms with less than MaxAssignments rows ("incomplete").
+
+    Args:
+        batch_path (pathlib.Path): directory of the batch
+        MaxAssignments (int): total number of worker answer expected per form
+        batch_size (int): number of forms per batch
+
+    Return
+        [list of dict]: issues with batch, form, issue and detail entries
+    """
+    batch_path = Path(batch_path)
+    batch_number = int(batch_path.name)
+    form_idxes = batchnumber2formidxes(batch_number, batch_size)
+    issues = []
+
+    def report(form, issue, detail):
+        issues.append(
+            {"batch": batch_number, "form": form, "issue": issue, "detail": detail}
+        )
+
+    found = set()
+    for form_path in sorted(batch_path.glob("[0-9]*.csv")):
+        if not form_path.stem.isdigit():
+            report(None, "malformed", f"{form_path.name} is not named after a form index")
+            continue
+        form_idx = int(form_path.stem)
+        if form_idx not in form_idxes:
+            report(
+                form_idx,
+                "misplaced",
+                f"Form index {form_idx} should not be present in batch {batch_number}",
+            )
+            continue
+        found.add(form_idx)
+        try:
+            columns = pd.read_csv(form_path, nrows=0).columns
+        except (pd.errors.ParserError, pd.errors.EmptyDataError, UnicodeDecodeError) as error:
+            report(form_idx, "malformed", str(error))
+            continue
+        if "WorkerID" not in columns:
+            report(form_idx, "malformed", "No WorkerID column")
+            continue
+        n_rows = count_csv_rows(form_path)
+        if n_rows < MaxAssignments:
+            report(form_idx, "incomplete", f"{n_rows}/{MaxAssignments} entries")
+    for form_idx in sorted(set(form_idxes) - found):
+        report(form_idx, "missing", f"Form {form_idx} was not downloaded")
+    return issues
+
+
+def load_manifest(manifest_path):
+    """
+    Load the json manifest at manifest_path
+
+    Return
+        [dict]: manifest, empty if the file does not exist
+    """
+    return load_json(manifest_path) or {}
+
+
+def save_manifest(manifest_path, manifest):
+    """
+    Save the manifest as json at manifest_path. Cf load_manifest
+    """
+    save_json(manifest_path, manifest)
+
+
+def normalize_worker_ids(worker_ids):
+    """
+    Normalize the WorkerIDs entered in the forms: surrounding spaces removed, upper case (as MTurk Worker Ids)
+
+    Args:
+        worker_ids (pd.Series): WorkerIDs
+
+    Return
+        [pd.Series]: normalized WorkerIDs
+    """
+    return worker_ids.astype("string").str.strip().str.upper()
+
+
+def normalize_timestamps(timestamps):
+    """
+    Convert the Google Forms timestamps (e.g. "2020/11/30 10:00:00 AM GMT+1") to UTC datetimes.
+    Timestamps without time zone are considered as UTC, the ones which can't be parsed become NaT.
+
+    Args:
+        timestamps (pd.Series): timestamps as exported by Google Forms
+
+    Return
+        [pd.Series]: UTC datetimes
+    """
+    timestamps = timestamps.astype("string")
+    offsets = timestamps.str.extract(GMT_OFFSET)
+    minutes = pd.to_numeric(offsets[1]).fillna(0) * 60 + pd.to_numeric(offsets[2]).fillna(0)
+    minutes = minutes.where(offsets[0] != "-", -minutes)
+    local = pd.to_datetime(
+        timestamps.str.replace(GMT_OFFSET, "", regex=True), errors="coerce"
+    )
+    return (local - pd.to_timedelta(minutes, unit="min")).dt.tz_localize("UTC")
+
+
+def build_results_dataset(parent_dir, dataset_dir=None):
+    """
+    Merge the forms results of all the batches (parent_dir/<batch>/<form>.csv, cf create_batch_directories)
+    into a Parquet dataset partitioned by batch and form, with normalized WorkerID (cf normalize_worker_ids)
+    and Timestamp (cf normalize_timestamps) columns.
+    The build is incremental: only the csv whose size or modification time changed since the previous build
+    are processed again, and the partitions of deleted csv are removed. Requires pyarrow.
+
+    Args:
+        parent_dir (pathlib.Path): parent directory containing the batches
+        dataset_dir (pathlib.Path): directory of the dataset. Defaults to parent_dir/dataset
+
+    Return
+        [list of str]: csv files (relatively to parent_dir) processed by the build
+    """
+    if pa is None:
+        raise ImportError("pyarrow is required to build the results dataset")
+    parent_dir = Path(parent_dir)
+    if dataset_dir is None:
+        dataset_dir = parent_dir.joinpath("dataset")
+    dataset_dir = Path(dataset_dir)
+    dataset_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = dataset_dir.joinpath(DATASET_MANIFEST_FILENAME)
+    schema_path = dataset_dir.joinpath(DATASET_SCHEMA_FILENAME)
+    manifest = load_manifest(manifest_path)
+    schema = pq.read_schema(schema_path) if schema_path.exists() else None
+    # partitions left half-written by an interrupted build
+    for tmp_path in dataset_dir.glob("batch=*/form=*/*.tmp"):
+        tmp_path.unlink()
+
+    csv_paths = {
+        f"{path.parent.name}/{path.name}": path
+        for path in parent_dir.glob("[0-9]*/[0-9]*.csv")
+        if path.parent.name.isdigit() and path.stem.isdigit()
+    }
+    processed = []
+    for key, path in sorted(csv_paths.items()):
+        stat = path.stat()
+        signature = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        if manifest.get(key) == signature:
+            continue
+        table = pa.Table.from_pandas(
+            normalize_form_results(pd.read_csv(path)), preserve_index=False
+        )
+        schema = table.schema if schema is None else unify_results_schemas(schema, table.schema)
+        partition_dir = dataset_dir.joinpath(
+            f"batch={int(path.parent.name)}", f"form={int(path.stem)}"
+        )
+        partition_dir.mkdir(parents=True, exist_ok=True)
+        # write then rename: readers never see a truncated partition, the "." prefix
+        # hides the temporary file from the pyarrow datasets discovery
+        tmp_path = partition_dir.joinpath(".part-0.parquet.tmp")
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, partition_dir.joinpath("part-0.parquet"))
+        manifest[key] = signature
+        processed.append(key)
+
+    for key in set(manifest) - set(csv_paths):
+        batch, form = key[: -len(".csv")].split("/")
+        shutil.rmtree(
+            dataset_dir.joinpath(f"batch={int(batch)}", f"form={int(form)}"),
+            ignore_errors=True,
+        )
+        del manifest[key]
+
+    if schema is not None:
+        pq.write_metadata(schema.remove_metadata(), schema_path)
+    save_manifest(manifest_path, manifest)
+    print(f"Processed {len(processed)}/{len(csv_paths)} csv files")
+    return processed
+
+
+def normalize_form_results(df):
+    """
+    Helper function for build_results_dataset: normalize the WorkerID and Timestamp columns of the results of a form
+    """
+    df = df.copy()
+    if "WorkerID" in df.columns:
+        df["WorkerID"] = normalize_worker_ids(df["WorkerID"])
+    if "Timestamp" in df.columns:
+        df["Timestamp"] = normalize_timestamps(df["Timestamp"])
+    return df
+
+
+def unify_results_schemas(schema, other):
+    """
+    Helper function for build_results_dataset: merge the schemas of the forms results. Numeric types are
+    promoted to a common type, columns with incompatible types across forms become strings.
+    """
+    fields = {field.name: field for field in schema}
+    for field in other:
+        if field.name not in fields or fields[field.name].type == field.type:
+            fields.setdefault(field.name, field)
+            continue
+        try:
+            fields[field.name] = pa.unify_schemas(
+                [pa.schema([fields[field.name]]), pa.schema([field])],
+                promote_options="permissive",
+            ).field(0)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            fields[field.name] = pa.field(field.name, pa.string())
+    return pa.schema(list(fields.values()))
+
+
+def read_results_dataset(dataset_dir, columns=None, filter=None):
+    """
+    Read the results dataset built by build_results_dataset. The filter is pushed down to the
+    partitions (batch, form) and to the Parquet row groups statistics: only the matching data is read.
+    Requires pyarrow.
+
+    Args:
+        dataset_dir (pathlib.Path): directory of the dataset
+        columns (list of str): columns to read, all of them if None
+        filter (pyarrow.compute.Expression): rows to read, e.g. (ds.field("batch") == 3) & (ds.field("WorkerID") == "A1B2C3")
+
+    Return
+        [pd.DataFrame]: results of the matching forms, with batch and form columns
+    """
+    if pa is None:
+        raise ImportError("pyarrow is required to read the results dataset")
+    dataset_dir = Path(dataset_dir)
+    schema = pq.read_schema(dataset_dir.joinpath(DATASET_SCHEMA_FILENAME))
+    partitioning = ds.partitioning(
+        pa.schema([(name, pa.int64()) for name in DATASET_PARTITIONING]), flavor="hive"
+    )
+    schema = pa.unify_schemas([schema, partitioning.schema])
+    dataset = ds.dataset(
+        dataset_dir, format="parquet", partitioning=partitioning, schema=schema
+    )
+    return dataset.to_table(columns=columns, filter=filter).to_pandas()
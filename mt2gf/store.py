@@ -0,0 +1,521 @@
+"""
+Local state of a run (HITs, forms, batches, assignments, tagged workers) stored in an SQLite database,
+allowing the Turker, the Watcher and the ControlPanel to share it from several threads or processes.
+"""
+import pickle as pk
+import sqlite3
+import threading
+from collections.abc import MutableMapping
+from datetime import datetime
+from pathlib import Path
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS batches (
+    batch_number INTEGER PRIMARY KEY,
+    created_at TEXT
+);
+CREATE TABLE IF NOT EXISTS forms (
+    form_idx INTEGER PRIMARY KEY,
+    url TEXT,
+    driveid TEXT,
+    batch_number INTEGER
+);
+CREATE INDEX IF NOT EXISTS forms_batch_number ON forms (batch_number);
+CREATE TABLE IF NOT EXISTS hits (
+    hit_id TEXT PRIMARY KEY,
+    form_idx INTEGER NOT NULL,
+    hit_type_id TEXT,
+    created_at TEXT
+);
+CREATE INDEX IF NOT EXISTS hits_form_idx ON hits (form_idx);
+CREATE TABLE IF NOT EXISTS hit_states (
+    hit_id TEXT PRIMARY KEY,
+    status TEXT,
+    max_assignments INTEGER,
+    n_available INTEGER,
+    n_pending INTEGER,
+    n_completed INTEGER,
+    expiration TEXT
+);
+CREATE TABLE IF NOT EXISTS assignments (
+    assignment_id TEXT PRIMARY KEY,
+    hit_id TEXT NOT NULL,
+    worker_id TEXT,
+    status TEXT,
+    accept_time TEXT,
+    submit_time TEXT,
+    answer TEXT,
+    updated_at TEXT
+);
+CREATE INDEX IF NOT EXISTS assignments_hit_id ON assignments (hit_id);
+CREATE INDEX IF NOT EXISTS assignments_status ON assignments (status);
+CREATE TABLE IF NOT EXISTS tagged_workers (
+    worker_id TEXT NOT NULL,
+    qualification_type_id TEXT NOT NULL,
+    tagged_at TEXT,
+    PRIMARY KEY (worker_id, qualification_type_id)
+);
+CREATE TABLE IF NOT EXISTS worker_infos (
+    path TEXT NOT NULL,
+    worker_id TEXT NOT NULL,
+    form_idx INTEGER NOT NULL,
+    assignment_id TEXT NOT NULL,
+    saved_at TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS worker_infos_key ON worker_infos (path, worker_id, form_idx, assignment_id);
+"""
+
+
+class StateStore:
+    """
+    Transactional store of the state of a run, backed by an SQLite database in WAL mode: readers
+    never block the writer, and every record is read/updated through its primary key or an index.
+    Each thread uses its own connection.
+    """
+
+    def __init__(self, db_path):
+        """
+        Args:
+            db_path (str): path to the SQLite database, created if it does not exist
+        """
+        self.db_path = Path(db_path)
+        self.thread_data = threading.local()
+        with self.connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def connection(self):
+        """
+        Return the connection of the calling thread. Used as a context manager, it wraps
+        the statements in a transaction.
+
+        Returns:
+            [sqlite3.Connection]: connection to the database
+        """
+        if not hasattr(self.thread_data, "conn"):
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.thread_data.conn = conn
+        return self.thread_data.conn
+
+    def migrate_hit2form(self, hit2form_path):
+        """
+        Import once the HIT ids -> forms indexes mapping pickled by former versions of the Turker.
+
+        Args:
+            hit2form_path (str): path to the hit2form pickle
+        """
+        hit2form_path = Path(hit2form_path)
+        key = f"migrated:{hit2form_path.name}"
+        if not hit2form_path.exists() or self.get_meta(key) is not None:
+            return
+        with open(hit2form_path, "rb") as f:
+            hit2form = pk.load(f)
+        with self.connection() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO hits (hit_id, form_idx) VALUES (?, ?)",
+                [(hit_id, int(form_idx)) for hit_id, form_idx in hit2form.items()],
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                (key, datetime.now().isoformat()),
+            )
+        print(f"Migrated {len(hit2form)} hits from {hit2form_path}")
+
+    def get_meta(self, key):
+        """
+        Return the value associated with key in the meta table, None if absent
+        """
+        row = (
+            self.connection()
+            .execute("SELECT value FROM meta WHERE key = ?", (key,))
+            .fetchone()
+        )
+        return None if row is None else row[0]
+
+    def set_meta(self, key, value):
+        """
+        Associate value with key in the meta table
+        """
+        with self.connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value)
+            )
+
+    def add_forms(self, gform_map, batch_number=None):
+        """
+        Record the forms of a gform_map and the batch they belong to
+
+        Args:
+            gform_map (dict): as returned by mt2gf.gform.get_gform_map
+            batch_number (int): index of the batch of the forms, if any
+        """
+        with self.connection() as conn:
+            if batch_number is not None:
+                conn.execute(
+                    "INSERT OR IGNORE INTO batches (batch_number, created_at) VALUES (?, ?)",
+                    (batch_number, datetime.now().isoformat()),
+                )
+            conn.executemany(
+                "INSERT OR REPLACE INTO forms (form_idx, url, driveid, batch_number) VALUES (?, ?, ?, ?)",
+                [
+                    (int(idx), val.get("url"), val.get("driveid"), batch_number)
+                    for idx, val in gform_map.items()
+                ],
+            )
+
+    def add_hit(self, hit_id, form_idx, hit_type_id=None):
+        """
+        Record a HIT created for the given form
+        """
+        with self.connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO hits (hit_id, form_idx, hit_type_id, created_at) VALUES (?, ?, ?, ?)",
+                (hit_id, int(form_idx), hit_type_id, datetime.now().isoformat()),
+            )
+
+    def get_form_hits(self, form_idx):
+        """
+        Return the ids of the HITs created for the given form
+
+        Returns:
+            [list of str]: MTurk HIT ids
+        """
+        rows = (
+            self.connection()
+            .execute("SELECT hit_id FROM hits WHERE form_idx = ?", (int(form_idx),))
+            .fetchall()
+        )
+        return [row[0] for row in rows]
+
+    def upsert_assignments(self, assignments):
+        """
+        Record the assignments along with their status
+
+        Args:
+            assignments (list of dict): as returned by client.list_assignments_for_hit
+        """
+        now = datetime.now().isoformat()
+        with self.connection() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO assignments "
+                "(assignment_id, hit_id, worker_id, status, accept_time, submit_time, answer, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        assignment["AssignmentId"],
+                        assignment["HITId"],
+                        assignment["WorkerId"],
+                        assignment["AssignmentStatus"],
+                        _isoformat(assignment.get("AcceptTime")),
+                        _isoformat(assignment.get("SubmitTime")),
+                        assignment.get("Answer"),
+                        now,
+                    )
+                    for assignment in assignments
+                ],
+            )
+
+    def set_assignments_status(self, statuses):
+        """
+        Update the status of already recorded assignments
+
+        Args:
+            statuses (dict): mapping AssignmentId to its new status
+        """
+        now = datetime.now().isoformat()
+        with self.connection() as conn:
+            conn.executemany(
+                "UPDATE assignments SET status = ?, updated_at = ? WHERE assignment_id = ?",
+                [(status, now, ass_id) for ass_id, status in statuses.items()],
+            )
+
+    def get_assignments(self, hit_id=None, statuses=None):
+        """
+        Return the recorded assignments of the HITs listed at the last call to StateStore.set_hits
+
+        Args:
+            hit_id (str): if set, only the assignments of this HIT are returned
+            statuses (list of str): if set, only the assignments with one of these statuses are returned
+
+        Returns:
+            [list of dict]: assignments with the keys of client.list_assignments_for_hit
+            (AssignmentId, HITId, WorkerId, AssignmentStatus, AcceptTime, SubmitTime, Answer)
+        """
+        query = (
+            "SELECT a.assignment_id, a.hit_id, a.worker_id, a.status, a.accept_time, a.submit_time, a.answer "
+            "FROM assignments a JOIN hit_states h ON a.hit_id = h.hit_id"
+        )
+        conditions, args = [], []
+        if hit_id is not None:
+            conditions.append("a.hit_id = ?")
+            args.append(hit_id)
+        if statuses is not None:
+            conditions.append(f"a.status IN ({', '.join('?' * len(statuses))})")
+            args += list(statuses)
+        if len(conditions) > 0:
+            query += " WHERE " + " AND ".join(conditions)
+        rows = self.connection().execute(query, args).fetchall()
+        return _assignments_from_rows(rows)
+
+    def get_unsaved_assignments(self, path):
+        """
+        Return the recorded assignments of the HITs created by the Turker which are not yet
+        saved in the workers infos file at path, cf StateStore.add_worker_infos
+
+        Returns:
+            [list of dict]: cf StateStore.get_assignments, with an additional FormIdx key
+        """
+        rows = (
+            self.connection()
+            .execute(
+                "SELECT a.assignment_id, a.hit_id, a.worker_id, a.status, a.accept_time, a.submit_time, "
+                "a.answer, h.form_idx FROM assignments a JOIN hits h ON a.hit_id = h.hit_id "
+                "LEFT JOIN worker_infos w ON w.path = ? AND w.worker_id = a.worker_id "
+                "AND w.form_idx = h.form_idx AND w.assignment_id = a.assignment_id "
+                "WHERE w.assignment_id IS NULL",
+                (str(path),),
+            )
+            .fetchall()
+        )
+        assignments = _assignments_from_rows([row[:-1] for row in rows])
+        for assignment, row in zip(assignments, rows):
+            assignment["FormIdx"] = row[-1]
+        return assignments
+
+    def add_worker_infos(self, path, keys, append=None):
+        """
+        Record the workers infos saved in the file at path. The keys already recorded are ignored.
+
+        Args:
+            path (str): path to the workers infos file
+            keys (list of tuple): (WorkerId, FormIdx, AssignmentId) of each saved row
+            append (func): function called with the list of keys newly recorded, writing the corresponding
+            rows into the file. The keys are only recorded if it succeeds.
+
+        Returns:
+            [list of tuple]: keys newly recorded
+        """
+        now = datetime.now().isoformat()
+        with self.connection() as conn:
+            new_keys = [
+                key
+                for key in keys
+                if conn.execute(
+                    "INSERT OR IGNORE INTO worker_infos (path, worker_id, form_idx, assignment_id, saved_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (str(path), key[0], int(key[1]), key[2], now),
+                ).rowcount
+                == 1
+            ]
+            if append is not None and len(new_keys) > 0:
+                append(new_keys)
+        return new_keys
+
+    def count_assignments(self):
+        """
+        Count the recorded assignments of each HIT by status
+
+        Returns:
+            [dict]: mapping each HIT id to a dict mapping each status to its number of assignments
+        """
+        rows = (
+            self.connection()
+            .execute("SELECT hit_id, status, COUNT(*) FROM assignments GROUP BY hit_id, status")
+            .fetchall()
+        )
+        counts = {}
+        for hit_id, status, count in rows:
+            counts.setdefault(hit_id, {})[status] = count
+        return counts
+
+    def set_hits(self, hits):
+        """
+        Replace the recorded HITs states with the provided listing
+
+        Args:
+            hits (list of dict): as returned by client.list_hits
+        """
+        with self.connection() as conn:
+            conn.execute("DELETE FROM hit_states")
+            conn.executemany(
+                "INSERT INTO hit_states "
+                "(hit_id, status, max_assignments, n_available, n_pending, n_completed, expiration) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        hit["HITId"],
+                        hit["HITStatus"],
+                        hit["MaxAssignments"],
+                        hit.get("NumberOfAssignmentsAvailable"),
+                        hit.get("NumberOfAssignmentsPending"),
+                        hit.get("NumberOfAssignmentsCompleted"),
+                        _isoformat(hit.get("Expiration")),
+                    )
+                    for hit in hits
+                ],
+            )
+
+    def get_hits(self):
+        """
+        Return the HITs recorded at the last call to StateStore.set_hits
+
+        Returns:
+            [list of dict]: HITs with the keys of client.list_hits (HITId, HITStatus, MaxAssignments,
+            NumberOfAssignmentsAvailable, NumberOfAssignmentsPending, NumberOfAssignmentsCompleted, Expiration)
+        """
+        rows = (
+            self.connection()
+            .execute(
+                "SELECT hit_id, status, max_assignments, n_available, n_pending, n_completed, expiration "
+                "FROM hit_states"
+            )
+            .fetchall()
+        )
+        keys = [
+            "HITId",
+            "HITStatus",
+            "MaxAssignments",
+            "NumberOfAssignmentsAvailable",
+            "NumberOfAssignmentsPending",
+            "NumberOfAssignmentsCompleted",
+            "Expiration",
+        ]
+        hits = [dict(zip(keys, row)) for row in rows]
+        for hit in hits:
+            hit["Expiration"] = _fromisoformat(hit["Expiration"])
+        return hits
+
+    def get_tagged_workers(self, qualification_type_id):
+        """
+        Return the workers recorded as tagged with the given qualification type
+
+        Returns:
+            [set of str]: tagged workers ids
+        """
+        rows = (
+            self.connection()
+            .execute(
+                "SELECT worker_id FROM tagged_workers WHERE qualification_type_id = ?",
+                (qualification_type_id,),
+            )
+            .fetchall()
+        )
+        return {row[0] for row in rows}
+
+    def set_tagged_workers(self, qualification_type_id, worker_ids, replace=False):
+        """
+        Record workers as tagged with the given qualification type
+
+        Args:
+            qualification_type_id (str): MTurk qualification type id
+            worker_ids (set of str): workers ids
+            replace (Bool): if set to True, the workers not in worker_ids are no longer recorded as tagged
+        """
+        now = datetime.now().isoformat()
+        with self.connection() as conn:
+            if replace:
+                conn.execute(
+                    "DELETE FROM tagged_workers WHERE qualification_type_id = ?",
+                    (qualification_type_id,),
+                )
+            conn.executemany(
+                "INSERT OR IGNORE INTO tagged_workers (worker_id, qualification_type_id, tagged_at) VALUES (?, ?, ?)",
+                [(worker_id, qualification_type_id, now) for worker_id in worker_ids],
+            )
+
+
+class HitFormMap(MutableMapping):
+    """
+    Dictionary-like view of the HIT ids -> forms indexes mapping of a StateStore: every
+    operation reads or writes a single record.
+    """
+
+    def __init__(self, store):
+        """
+        Args:
+            store (StateStore): store holding the mapping
+        """
+        self.store = store
+
+    def __getitem__(self, hit_id):
+        row = (
+            self.store.connection()
+            .execute("SELECT form_idx FROM hits WHERE hit_id = ?", (hit_id,))
+            .fetchone()
+        )
+        if row is None:
+            raise KeyError(hit_id)
+        return row[0]
+
+    def __setitem__(self, hit_id, form_idx):
+        self.store.add_hit(hit_id, form_idx)
+
+    def __delitem__(self, hit_id):
+        with self.store.connection() as conn:
+            cursor = conn.execute("DELETE FROM hits WHERE hit_id = ?", (hit_id,))
+        if cursor.rowcount == 0:
+            raise KeyError(hit_id)
+
+    def __iter__(self):
+        rows = self.store.connection().execute("SELECT hit_id FROM hits").fetchall()
+        return iter([row[0] for row in rows])
+
+    def __len__(self):
+        return self.store.connection().execute("SELECT COUNT(*) FROM hits").fetchone()[0]
+
+    def __contains__(self, hit_id):
+        row = (
+            self.store.connection()
+            .execute("SELECT 1 FROM hits WHERE hit_id = ?", (hit_id,))
+            .fetchone()
+        )
+        return row is not None
+
+    def values(self):
+        rows = self.store.connection().execute("SELECT form_idx FROM hits").fetchall()
+        return [row[0] for row in rows]
+
+    def items(self):
+        return self.store.connection().execute("SELECT hit_id, form_idx FROM hits").fetchall()
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+
+def _isoformat(value):
+    """
+    Convert the datetimes returned by boto3 to strings storable in SQLite
+    """
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _assignments_from_rows(rows):
+    """
+    Convert the rows of the assignments table to dicts with the keys of client.list_assignments_for_hit
+    """
+    keys = [
+        "AssignmentId",
+        "HITId",
+        "WorkerId",
+        "AssignmentStatus",
+        "AcceptTime",
+        "SubmitTime",
+        "Answer",
+    ]
+    assignments = [dict(zip(keys, row)) for row in rows]
+    for assignment in assignments:
+        assignment["AcceptTime"] = _fromisoformat(assignment["AcceptTime"])
+        assignment["SubmitTime"] = _fromisoformat(assignment["SubmitTime"])
+    return assignments
+
+
+def _fromisoformat(value):
+    """
+    Convert back the strings stored by _isoformat to datetimes
+    """
+    return None if value is None else datetime.fromisoformat(value)
@@ -1,7 +1,16 @@
 """ misc utilities functions"""
+import json
+import mmap
+import os
+import queue
+import threading
 from pathlib import Path
+import numpy as np
 import pandas as pd
 
+# end of stream marker passed between the stages of run_pipeline
+_END_OF_STREAM = object()
+
 def read_access_keys(file_path):
     """
     Read the AWS keys at the given file_path
@@ -17,3 +26,207 @@ def read_access_keys(file_path):
     aws_access_key_id = keys_df.loc[0][0]
     aws_secret_access_key = keys_df.loc[1][0]  if keys_df.shape == (2,1) else  keys_df.loc[1][0]
     return aws_access_key_id,aws_secret_access_key
+
+
+def load_json(file_path):
+    """
+    Load the json file at file_path
+
+    Args:
+        file_path (str): path to the json file
+
+    Return
+        [object]: content of the file, None if it does not exist
+    """
+    file_path = Path(file_path)
+    if not file_path.exists():
+        return None
+    with open(file_path, "r") as f:
+        return json.load(f)
+
+
+def save_json(file_path, data):
+    """
+    Save data as json at file_path. The json is written to a temporary file then renamed:
+    a reader (or an interrupted run) never sees a partially written file.
+
+    Args:
+        file_path (str): path to the json file
+        data (object): json serializable content
+    """
+    file_path = Path(file_path)
+    tmp_path = file_path.with_name(file_path.name + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, file_path)
+
+
+def count_csv_rows(file_path):
+    """
+    Count the rows of a csv file, header and blank lines excluded (as pd.read_csv), without parsing it:
+    the file is memory-mapped and its newlines counted. Newlines within quoted fields (e.g. free text
+    answers) do not start a new row.
+
+    Args:
+        file_path (str): path to the csv file
+
+    Return
+        [int]: number of rows
+    """
+    with open(file_path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return 0
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            data = np.frombuffer(mm, dtype=np.uint8)
+            newlines = np.flatnonzero(data == ord("\n"))
+            quotes = np.flatnonzero(data == ord('"'))
+            if len(quotes) > 0:
+                # a newline ends a row only if preceded by an even number of quotes (escaped quotes come in pairs)
+                newlines = newlines[np.searchsorted(quotes, newlines) % 2 == 0]
+            # end of the lines, without their optional carriage return
+            ends = newlines - 1
+            ends[ends >= 0] -= data[ends[ends >= 0]] == ord("\r")
+            blank = (ends < 0) | (data[np.maximum(ends, 0)] == ord("\n"))
+            n_lines = len(newlines) - np.count_nonzero(blank)
+            # last line without trailing newline
+            start = newlines[-1] + 1 if len(newlines) > 0 else 0
+            if len(mm[start:].strip()) > 0:
+                n_lines += 1
+            # the mapping can only be closed once no array refers to it
+            del data
+    return max(int(n_lines) - 1, 0)
+
+
+def run_pipeline(source, stages, queue_size=8, on_error=None):
+    """
+    Stream the items of source through a sequence of stages. Each stage runs in its own threads
+    and feeds the next one through a bounded queue, so that the stages overlap while the number
+    of items in flight remains bounded.
+
+    Args:
+        source (iterable): items fed to the first stage, consumed lazily in a dedicated thread
+        stages (list of (func, int)): for each stage, the function applied to every item and its number of threads.
+        The value returned by the function is passed to the next stage, None drops the item.
+        queue_size (int): maximal number of items waiting in front of each stage.
+        on_error (func): called with the item (None if the exception comes from source) and the exception
+        when a stage raises: its return value is added to the results, None drops the item. An item
+        raising an exception never stops the stream: without on_error (or if on_error raises), the first
+        exception is raised once every item went through the pipeline.
+
+    Return
+        [list]: values returned by the last stage (in completion order)
+    """
+    return Pipeline(stages, queue_size, on_error).run(source)
+
+
+class Pipeline:
+    """
+    Threads and queues of the stages run by run_pipeline
+    """
+
+    def __init__(self, stages, queue_size=8, on_error=None):
+        """
+        Args:
+            stages, queue_size, on_error: cf run_pipeline
+        """
+        self.stages = stages
+        self.on_error = on_error
+        self.queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+        self.remaining_workers = [n_workers for _, n_workers in stages]
+        self.results = []
+        self.errors = []
+        self.lock = threading.Lock()
+
+    def run(self, source):
+        """
+        Stream the items of source through the stages, cf run_pipeline
+        """
+        threads = [threading.Thread(target=self.__feed, args=(source,), daemon=True)]
+        for stage_idx, (_, n_workers) in enumerate(self.stages):
+            threads += [
+                threading.Thread(target=self.__work, args=(stage_idx,), daemon=True)
+                for _ in range(n_workers)
+            ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if len(self.errors) > 0:
+            raise self.errors[0]
+        return self.results
+
+    def __feed(self, source):
+        """
+        Helper function for Pipeline.run: put the items of source in the queue of the first stage
+        """
+        try:
+            for item in source:
+                self.queues[0].put(item)
+        except Exception as err:
+            self.__handle_error(None, err)
+        finally:
+            self.__close_stage(0)
+
+    def __work(self, stage_idx):
+        """
+        Helper function for Pipeline.run: apply the function of the stage to the items of its queue
+        until the end of the stream
+        """
+        last_stage = stage_idx == len(self.stages) - 1
+        try:
+            item = self.queues[stage_idx].get()
+            while item is not _END_OF_STREAM:
+                self.__process(stage_idx, item, last_stage)
+                item = self.queues[stage_idx].get()
+        finally:
+            # the last worker of a stage to finish closes the next stage, even if it died:
+            # the following stages would otherwise wait forever
+            with self.lock:
+                self.remaining_workers[stage_idx] -= 1
+                stage_done = self.remaining_workers[stage_idx] == 0
+            if stage_done and not last_stage:
+                self.__close_stage(stage_idx + 1)
+
+    def __process(self, stage_idx, item, last_stage):
+        """
+        Helper function for Pipeline.run: apply the function of the stage to the item and pass on the output
+        """
+        func, _ = self.stages[stage_idx]
+        try:
+            output = func(item)
+        except Exception as err:
+            self.__handle_error(item, err)
+            return
+        if output is None:
+            return
+        if last_stage:
+            with self.lock:
+                self.results.append(output)
+        else:
+            self.queues[stage_idx + 1].put(output)
+
+    def __handle_error(self, item, err):
+        """
+        Helper function for Pipeline.run: record the exception raised by a stage, cf run_pipeline
+        """
+        if self.on_error is None:
+            with self.lock:
+                self.errors.append(err)
+            return
+        try:
+            output = self.on_error(item, err)
+        except Exception as on_error_err:
+            with self.lock:
+                self.errors.append(on_error_err)
+            return
+        if output is not None:
+            with self.lock:
+                self.results.append(output)
+
+    def __close_stage(self, stage_idx):
+        """
+        Helper function for Pipeline.run: put an end of stream marker for each worker of the stage
+        """
+        for _ in range(self.stages[stage_idx][1]):
+            self.queues[stage_idx].put(_END_OF_STREAM)
@@ -1,14 +1,81 @@
+import io
 import threading
-from time import sleep
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from time import monotonic, sleep
 
 import pandas as pd
 from botocore.exceptions import ClientError
 
 from mt2gf.gform import download_multi_csv
-from mt2gf.mturk import create_mturk_client
+from mt2gf.mturk import (
+    create_mturk_client,
+    is_throttling_error,
+    iter_workers_with_qualification_type,
+)
 from mt2gf.utils import read_access_keys
 
 
+class AdaptiveScheduler:
+    """
+    Polling interval of the Watcher adapting to the arrival rate of the forms responses: the interval
+    shrinks when responses arrive quickly (so that workers can't answer many forms between two iterations)
+    and doubles at each iteration without new responses, always within [min_interval, max_interval].
+    """
+
+    def __init__(self, min_interval=2, max_interval=120, target_responses=1, smoothing=0.5):
+        """
+        Args:
+            min_interval (float): minimal interval in seconds between two iterations
+            max_interval (float): maximal interval in seconds between two iterations
+            target_responses (float): number of new responses expected between two iterations when responses are arriving
+            smoothing (float): weight of the last iteration in the arrival rate moving average (between 0 and 1)
+        """
+        if min_interval > max_interval:
+            raise ValueError("min_interval must be smaller than max_interval")
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.target_responses = target_responses
+        self.smoothing = smoothing
+        # current interval in seconds and observed arrival rate in responses per second
+        self.interval = min_interval
+        self.arrival_rate = 0.0
+        self.last_update = None
+
+    def update(self, n_new):
+        """
+        Update the arrival rate with the number of responses received since the last update
+        and return the interval to wait before the next iteration.
+
+        Args:
+            n_new (int): number of new responses since the last update
+
+        Returns:
+            [float]: interval in seconds
+        """
+        now = monotonic()
+        if self.last_update is None:
+            # first observation: the responses counted so far arrived over an unknown period
+            self.last_update = now
+            return self.interval
+        if now > self.last_update:
+            rate = n_new / (now - self.last_update)
+            self.arrival_rate = (
+                self.smoothing * rate + (1 - self.smoothing) * self.arrival_rate
+            )
+        self.last_update = now
+
+        if n_new == 0:
+            interval = self.interval * 2
+        elif self.arrival_rate == 0:
+            interval = self.interval
+        else:
+            interval = self.target_responses / self.arrival_rate
+        self.interval = min(max(interval, self.min_interval), self.max_interval)
+        return self.interval
+
+
 class Watcher:
     """
     Class to monitor the workers who answer more than max_forms_per_worker forms
@@ -30,6 +97,16 @@ class Watcher:
         qualification_type_id=None,
         max_forms_per_worker=2,
         production=False,
+        page_size=100,
+        max_workers=1,
+        sync_mode="metadata",
+        incremental=False,
+        reconcile_interval=300,
+        max_tag_retries=5,
+        retry_backoff=1,
+        min_sleep_time=2,
+        max_sleep_time=120,
+        store=None,
     ):
         """
         Args:
@@ -46,6 +123,19 @@ class Watcher:
             type id designated by qualification_type_name.
             max_forms_per_worker (int): maximum number of forms a worker is allowed to complete in the pool
             production (Bool):  set to False in order to use the MTurk Sandbox, True otherwise
+            page_size (int): number of qualifications requested per page when listing tagged workers (at most 100)
+            max_workers (int): number of forms downloaded/workers tagged concurrently at each monitoring iteration
+            sync_mode (str): how the forms results are kept up to date, cf mt2gf.gform.download_multi_csv
+            incremental (Bool): if set to True, only the new rows of the forms results are downloaded, cf mt2gf.gform.download_multi_csv
+            reconcile_interval (float): minimal time in seconds between two reconciliations of the locally cached
+            tagged workers with the full listing from MTurk, cf Watcher.sync_tagged_workers
+            max_tag_retries (int): number of times the tagging of a worker is retried when throttled by MTurk
+            retry_backoff (float): time in seconds before the first retry of a throttled tagging, doubled at each retry
+            min_sleep_time (float): minimal time in seconds between two monitoring iterations, cf AdaptiveScheduler
+            max_sleep_time (float): maximal time in seconds between two monitoring iterations, cf AdaptiveScheduler
+            store (mt2gf.store.StateStore): store where the tagged workers are persisted, e.g. the store of the Turker
+            of the run. If set, the tagged workers cache is reloaded from it after a restart instead of being
+            rebuilt from the full listing from MTurk.
         """
         self.production = production
         # retrieval of the access keys
@@ -58,9 +148,30 @@ class Watcher:
         self.form_results_dir = form_results_dir
         self.gform_map = gform_map
         self.drive_service = drive_service
+        self.page_size = page_size
+        self.max_workers = max_workers
+        self.sync_mode = sync_mode
+        self.incremental = incremental
+
+        self.reconcile_interval = reconcile_interval
+        self.max_tag_retries = max_tag_retries
+        self.retry_backoff = retry_backoff
+        self.scheduler = AdaptiveScheduler(min_sleep_time, max_sleep_time)
+        self.store = store
 
         self.thread = None
+        # tagged workers cache: updated by the Watcher's own taggings, reconciled with MTurk periodically
         self.tagged_workers = set()
+        self.last_reconciliation = None
+        # throttled taggings: worker id -> (number of attempts, time of the next attempt)
+        self.retry_queue = {}
+        # taggings which failed for good: worker id -> error message
+        self.failed_workers = {}
+        # WorkerID count index: per form csv, its byte size and WorkerID column at the last count
+        self.form_counts = {}
+        self.worker_counts = Counter()
+        self.workers_over_limit = set()
+        self.n_new_responses = 0
         existing_qualifs = self.client.list_qualification_types(
             MustBeRequestable=False, Query=qualification_type_name
         )["QualificationTypes"]
@@ -88,6 +199,12 @@ class Watcher:
                     "QualificationTypeId"
                 ]
 
+        if self.store is not None:
+            self.tagged_workers = self.store.get_tagged_workers(self.qualification_type_id)
+            if len(self.tagged_workers) > 0:
+                # the persisted cache is reconciled after reconcile_interval seconds, as any other
+                self.last_reconciliation = monotonic()
+
     def get_qualif_requirement(self):
         """
         Return the qualification requirement associated with the current watcher.
@@ -109,16 +226,73 @@ class Watcher:
             [set of str]: set of Worker Id that need to be tagged in order not to
             find any more forms from the pool in their MTurk searche
         """
-        download_multi_csv(self.gform_map, self.form_results_dir, self.drive_service)
-        meta_df = []
-        for form_path in self.form_results_dir.iterdir():
-            df = pd.read_csv(form_path, usecols=["WorkerID"])
-            meta_df.append(df)
-        meta_df = pd.concat(meta_df, axis=0)
-        # number of different
-        forms_count = meta_df["WorkerID"].value_counts()
-        forms_count = forms_count[forms_count >= self.max_forms_per_worker]
-        return set(forms_count.index.tolist())
+        download_multi_csv(
+            self.gform_map,
+            self.form_results_dir,
+            self.drive_service,
+            max_workers=self.max_workers,
+            sync_mode=self.sync_mode,
+            incremental=self.incremental,
+        )
+        self.update_worker_counts()
+        return set(self.workers_over_limit)
+
+    def update_worker_counts(self):
+        """
+        Update the number of forms answered by each worker (Watcher.worker_counts) from the forms csv
+        which changed since the last update. Forms responses only get appended to the csv: only the bytes
+        added since the last update are parsed. A csv which shrank is counted again from scratch.
+
+        Returns:
+            [int]: number of new responses
+        """
+        n_new = 0
+        for form_path in Path(self.form_results_dir).glob("[0-9]*.csv"):
+            size = form_path.stat().st_size
+            entry = self.form_counts.get(form_path.stem)
+            if entry is not None and entry["size"] == size:
+                continue
+            if entry is None or size < entry["size"]:
+                if entry is not None:
+                    self.__add_worker_ids(entry["counts"], -1)
+                header = pd.read_csv(form_path, nrows=0).columns.tolist()
+                entry = {"size": 0, "column": header.index("WorkerID"), "counts": Counter()}
+                self.form_counts[form_path.stem] = entry
+                worker_ids = pd.read_csv(form_path, usecols=["WorkerID"])["WorkerID"]
+            else:
+                worker_ids = self.__read_new_worker_ids(form_path, entry)
+            new_counts = Counter(worker_ids.dropna())
+            entry["counts"].update(new_counts)
+            entry["size"] = size
+            self.__add_worker_ids(new_counts, 1)
+            n_new += len(worker_ids)
+        self.n_new_responses = n_new
+        return n_new
+
+    def __read_new_worker_ids(self, form_path, entry):
+        """
+        Helper function for Watcher.update_worker_counts: parse the WorkerID of the rows appended
+        to form_path since its last count.
+        """
+        with open(form_path, "rb") as f:
+            f.seek(entry["size"])
+            tail = f.read()
+        if len(tail.strip()) == 0:
+            return pd.Series([], dtype=object)
+        rows = pd.read_csv(io.BytesIO(tail), header=None, usecols=[entry["column"]])
+        return rows[entry["column"]]
+
+    def __add_worker_ids(self, counts, sign):
+        """
+        Helper function for Watcher.update_worker_counts: add (sign=1) or remove (sign=-1) the given
+        counts from the running totals and keep track of the workers reaching max_forms_per_worker.
+        """
+        for worker_id, count in counts.items():
+            self.worker_counts[worker_id] += sign * count
+            if self.worker_counts[worker_id] >= self.max_forms_per_worker:
+                self.workers_over_limit.add(worker_id)
+            else:
+                self.workers_over_limit.discard(worker_id)
 
     def get_tagged_workers(self):
         """
@@ -129,53 +303,150 @@ class Watcher:
         """
         # search for workers already tagged
         tagged_workers = set()
-        qualifs = self.client.list_workers_with_qualification_type(
-            QualificationTypeId=self.qualification_type_id
+        qualifs = iter_workers_with_qualification_type(
+            self.client, self.qualification_type_id, self.page_size
         )
-        for qualif in qualifs["Qualifications"]:
+        for qualif in qualifs:
             if qualif["QualificationTypeId"] == self.qualification_type_id:
                 tagged_workers.add(qualif["WorkerId"])
         return tagged_workers
 
-    def monitor(self, sleep_time=10):
+    def sync_tagged_workers(self, force=False):
+        """
+        Return the locally cached set of tagged workers. The cache is reconciled with the full
+        listing from MTurk (Watcher.get_tagged_workers) if reconcile_interval seconds elapsed since
+        the last reconciliation.
+
+        Args:
+            force (Bool): if set to True, reconcile the cache regardless of the time elapsed
+
+        Returns:
+            [set of str]: tagged workers ids
+        """
+        now = monotonic()
+        reconcile = [
+            force,
+            self.last_reconciliation is None,
+            self.last_reconciliation is not None
+            and now - self.last_reconciliation >= self.reconcile_interval,
+        ]
+        if any(reconcile):
+            self.tagged_workers = self.get_tagged_workers()
+            self.last_reconciliation = now
+            if self.store is not None:
+                self.store.set_tagged_workers(
+                    self.qualification_type_id, self.tagged_workers, replace=True
+                )
+        return self.tagged_workers
+
+    def tag_workers(self, worker_ids):
+        """
+        Tag concurrently (max_workers threads) the provided workers along with the workers of the retry
+        queue whose backoff elapsed. Throttled taggings go back to the retry queue (up to max_tag_retries
+        times, after which the worker is left to the next iteration), other failures (e.g. invalid worker ids)
+        are recorded in Watcher.failed_workers.
+
+        Args:
+            worker_ids (set of str): Worker Ids to tag
+
+        Returns:
+            [set of str]: Worker Ids successfully tagged
+        """
+        now = monotonic()
+        due = {
+            worker_id
+            for worker_id, (_, next_attempt) in self.retry_queue.items()
+            if next_attempt <= now
+        }
+        # workers waiting in the retry queue are only tagged once their backoff elapsed
+        worker_ids = list((set(worker_ids) - set(self.retry_queue)) | due)
+        if len(worker_ids) == 0:
+            return set()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            errors = list(executor.map(self.__tag_worker, worker_ids))
+
+        tagged = set()
+        for worker_id, error in zip(worker_ids, errors):
+            attempts, _ = self.retry_queue.pop(worker_id, (0, None))
+            if error is None:
+                tagged.add(worker_id)
+                self.tagged_workers.add(worker_id)
+                print(f"Tagged {worker_id}")
+            elif is_throttling_error(error):
+                if attempts < self.max_tag_retries:
+                    next_attempt = now + self.retry_backoff * 2 ** attempts
+                    self.retry_queue[worker_id] = (attempts + 1, next_attempt)
+                else:
+                    # out of the retry queue: tagged again from scratch at the next iteration
+                    print(f"Tagging of {worker_id} still throttled, postponed")
+            else:
+                self.failed_workers[worker_id] = str(error)
+                print(f"Non valid worker id {worker_id}")
+        if self.store is not None:
+            self.store.set_tagged_workers(self.qualification_type_id, tagged)
+        return tagged
+
+    def __tag_worker(self, worker_id):
+        """
+        Helper function for Watcher.tag_workers: tag a single worker.
+
+        Returns:
+            [botocore.exceptions.ClientError]: the error raised by MTurk, None if the worker was tagged
+        """
+        try:
+            self.client.associate_qualification_with_worker(
+                QualificationTypeId=self.qualification_type_id,
+                WorkerId=worker_id,
+                IntegerValue=1,
+                SendNotification=False,
+            )
+        except ClientError as error:
+            return error
+        return None
+
+    def __retries_due(self):
+        """
+        Whether some workers of the retry queue can be tagged again.
+        """
+        now = monotonic()
+        return any(
+            next_attempt <= now for _, next_attempt in self.retry_queue.values()
+        )
+
+    def monitor(self, sleep_time=None):
         """
         Function to run in detached thread: checks periodically for new workers to tag
         Downloads at each iteration the most recent version of the results for the current batch's
         forms.
+        The time between two iterations is set by Watcher.scheduler, whose interval and arrival_rate
+        attributes give the current polling interval and the observed responses arrival rate.
 
         Args:
-            sleep_time (int): time to sleep at each iteration
+            sleep_time (int): if set to a value, time to sleep at each iteration instead of the adaptive interval
         """
+        if sleep_time is not None:
+            self.scheduler = AdaptiveScheduler(sleep_time, sleep_time)
         # search for workers already tagged
         i = 0
         while self.monitor:
             # information comes from google drive
-            tagged_workers = self.get_tagged_workers()
-            self.tagged_workers = tagged_workers
+            tagged_workers = self.sync_tagged_workers()
 
             workers2tag = self.get_workers2tag()
-            # remove the workers already tagged
-            workers2tag = workers2tag - tagged_workers
-
-            for workerid in tagged_workers:
-                print(f"{workerid},")
-
-            for workerid in workers2tag:
-                try:
-                    self.client.associate_qualification_with_worker(
-                        QualificationTypeId=self.qualification_type_id,
-                        WorkerId=workerid,
-                        IntegerValue=1,
-                        SendNotification=False,
-                    )
-                except ClientError:
-                    print(f"Non valid worker id {workerid}")
+            # remove the workers already tagged or impossible to tag
+            workers2tag = workers2tag - tagged_workers - set(self.failed_workers)
+            self.tag_workers(workers2tag)
             i += 1
 
-            for i in range(sleep_time):
-                sleep(1)
+            wake_up = monotonic() + self.scheduler.update(self.n_new_responses)
+            while monotonic() < wake_up:
+                sleep(min(1, max(wake_up - monotonic(), 0)))
                 if not self.monitor:
                     return 0
+                # throttled taggings are retried without waiting for the next iteration
+                if self.__retries_due():
+                    self.tag_workers(set())
 
     def start_monitor(
         self,
@@ -217,4 +488,7 @@ class Watcher:
                 QualificationTypeId=self.qualification_type_id,
                 Reason="First pilot terminated, you can answer the next pilots",
             )
+        self.tagged_workers = set()
+        if self.store is not None:
+            self.store.set_tagged_workers(self.qualification_type_id, set(), replace=True)
         print(f"All workers untagged! ({workers})")
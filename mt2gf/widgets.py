@@ -43,19 +43,19 @@ class ControlPanel():
         Call Turker.approve_correct_hits: this
         """
         self.turk.save_worker_infos()
-        self.turk.approve_correct_hits(dry_run=True)
+        display(self.turk.approve_correct_hits(dry_run=True))
 
     def approve_correct(self,b):
         """
         """
         self.turk.save_worker_infos()
-        self.turk.approve_correct_hits(dry_run=False)
+        display(self.turk.approve_correct_hits(dry_run=False))
 
     def approve_all(self,b):
         """
         """
         self.turk.save_worker_infos()
-        self.turk.approve_all_hits()
+        display(self.turk.approve_all_hits())
 
     def list_assignments(self,b):
         """
@@ -12,4 +12,6 @@ setup(
     license='MIT',
     python_requires='>=3.6',
     install_requires= Path("requirements.txt").read_text().splitlines(),
+    # results cache (mt2gf.cache) and results dataset (mt2gf.preprocess)
+    extras_require={"arrow": ["pyarrow>=1.0.0"]},
 )